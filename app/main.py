@@ -1,18 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import shutil
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 import os
+import csv
+import json
+import uuid
+import hashlib
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from python_multipart.multipart import MultipartParser, parse_options_header
 import pandas as pd
-from services.preprocessing import preprocess_pipeline
-from services.segmentation import perform_segmentation
+import numpy as np
+from services.preprocessing import preprocess_pipeline_streaming, missing_columns
+from services.dataset_cache import DatasetCache
+from services.segmentation import SegmentationModel
 from models.revenue_model import RevenueModel
 from models.churn_model import ChurnModel
-from services.simulator import PricingSimulator
+from services.portfolio import simulate_portfolio
+from services.simulator import LRUCache
+from services.analytics import AnalyticsAggregates
+from services.workspaces import WorkspaceManager
+from models.sharding import UnknownSegmentError
 from services.data_generator import generate_synthetic_data
-from reports.report_generator import generate_pdf_report
-from app.auth import create_access_token, get_current_user, verify_password, get_password_hash
+from services.jobs import JobManager
+from services.training import train_models as train_model_pair, default_core_budget
+from services.metrics import REGISTRY, RequestMetricsMiddleware, ROWS_INGESTED, TRAINING_SECONDS, workspace_collector
+from app.auth import create_access_token, get_current_user, verify_password
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import Depends, status
 
@@ -33,19 +50,220 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Global instances (in a real app, use a proper model registry or dependency injection)
-revenue_model = RevenueModel()
-churn_model = ChurnModel()
-simulator = PricingSimulator(revenue_model, churn_model)
+# Outermost, so latency covers CORS handling and error responses too
+app.add_middleware(RequestMetricsMiddleware)
 
 DATA_DIR = "data/raw"
 os.makedirs(DATA_DIR, exist_ok=True)
-REPORTS_DIR = "reports"
-os.makedirs(REPORTS_DIR, exist_ok=True)
+# Core budget for a training run, so retraining can't starve the serving workers
+TRAINING_CORES = int(os.environ.get("TRAINING_CORES", default_core_budget()))
+# Processed uploads, keyed by a hash of the raw file (shared by all workspaces).
+# Entries no workspace serves are pruned on publish once unused for this long.
+dataset_cache = DatasetCache("data/cache")
+DATASET_CACHE_GRACE_SECONDS = int(os.environ.get("DATASET_CACHE_GRACE_SECONDS", 3600))
+# Uploads are streamed to disk in blocks and rejected once they exceed this size
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 512 * 1024 * 1024))
+UPLOAD_BLOCK_BYTES = 1024 * 1024
+# Room for multipart boundaries and part headers when checking Content-Length up front
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Each client/user gets a workspace with its own dataset, segmentation and models.
+# Idle workspaces are unloaded to disk once resident ones exceed the memory budget.
+WORKSPACE_MEMORY_MB = int(os.environ.get("WORKSPACE_MEMORY_MB", 1024))
+workspaces = WorkspaceManager(
+    "data/workspaces", dataset_cache, WORKSPACE_MEMORY_MB * 1024 * 1024,
+    # The default workspace keeps the original top-level layout
+    default_paths={
+        "root": "data/workspaces/default",
+        "registry_dir": "data/models",
+        "shards_dir": "data/shards",
+        "segmenter_path": "data/segmentation/segmenter.joblib"
+    }
+)
+
+@app.exception_handler(UnknownSegmentError)
+async def unknown_segment_handler(request, exc):
+    # Sharded models only know the segments they were trained on
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": exc.args[0]})
+
+# Cache and dataset gauges are read from the resident workspaces when /metrics is scraped
+REGISTRY.add_collector(workspace_collector(workspaces))
+
+# PDFs are rendered in memory on a worker pool, off the event loop; identical
+# results payloads are served from an LRU cache keyed by their content hash
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", 2))
+report_pool = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+report_cache = LRUCache(maxsize=int(os.environ.get("REPORT_CACHE_SIZE", 128)))
+REPORT_CHUNK_BYTES = 64 * 1024
+
+# Training runs in the background; the serving models are only replaced once a run completes
+jobs = JobManager(max_workers=1)
+
+def get_workspace(x_workspace: str = Header(WorkspaceManager.DEFAULT)):
+    """Resolves the X-Workspace header (default: "default") to a loaded workspace."""
+    try:
+        return workspaces.get(x_workspace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def publish_models(workspace, df, new_revenue_model, new_churn_model, new_analytics=None, sharded=False,
+                   dataset_key=None):
+    """Swaps freshly trained models (and their dataset) in for serving in a workspace."""
+    workspace.publish(df, new_revenue_model, new_churn_model, new_analytics, sharded=sharded, dataset_key=dataset_key)
+    workspaces.enforce_budget(keep=workspace.name)
+    pruned = workspaces.prune_dataset_cache(DATASET_CACHE_GRACE_SECONDS)
+    if pruned:
+        print(f"Pruned {len(pruned)} unreferenced cached datasets")
+
+def training_stages(workspace, load_stages, sharded=False):
+    """
+    Job stages that train fresh model instances on context['df'] and publish them to workspace.
+    load_stages put the dataset into the context first.
+    sharded=True trains per-segment shards instead, retraining only segments whose data changed.
+    """
+    def train(ctx):
+        if sharded:
+            shard_store = workspace.shard_store
+            ctx['shards'] = shard_store.train(ctx['df'], n_jobs=TRAINING_CORES)
+            if ctx['shards']['trained']:
+                TRAINING_SECONDS.observe(ctx['shards']['seconds'], model="sharded")
+            # A frozen view: the snapshot being served keeps its own shards until publish swaps it out
+            view = shard_store.view()
+            ctx['revenue_model'], ctx['churn_model'] = view.revenue_model, view.churn_model
+        else:
+            ctx['revenue_model'], ctx['churn_model'], ctx['timings'] = train_model_pair(ctx['df'], n_jobs=TRAINING_CORES)
+
+    def publish(ctx):
+        if sharded:
+            # Shards are persisted by the shard store itself
+            publish_models(workspace, ctx['df'], ctx['revenue_model'], ctx['churn_model'], ctx.get('analytics'),
+                           sharded=True, dataset_key=ctx.get('dataset_key'))
+            ctx['result'] = {"rows": len(ctx['df']), "shards": ctx['shards'], "ingest": ctx.get('ingest'),
+                             "segmentation": ctx.get('segmentation')}
+            return
+        version = workspace.registry.register(ctx['revenue_model'], ctx['churn_model'], ctx['df'],
+                                              upload_hash=ctx.get('upload_hash'))
+        publish_models(workspace, ctx['df'], ctx['revenue_model'], ctx['churn_model'], ctx.get('analytics'),
+                       dataset_key=ctx.get('dataset_key'))
+        ctx['result'] = {"rows": len(ctx['df']), "model_version": version,
+                         "training_seconds": ctx['timings'], "ingest": ctx.get('ingest'),
+                         "segmentation": ctx.get('segmentation')}
+
+    return load_stages + [
+        ("train_models", train),
+        ("publish", publish)
+    ]
 
-# Global Dataframe storage (simplification for demo)
-global_df = None
+def check_csv_header(head):
+    """Rejects an upload whose first line lacks a required column."""
+    first_line = head.split(b"\n", 1)[0].decode("utf-8-sig", errors="replace")
+    columns = next(csv.reader([first_line]), [])
+    missing = missing_columns(columns)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {', '.join(missing)}")
+
+async def receive_upload(request, directory, field="file"):
+    """
+    Streams the `field` file of a multipart/form-data request body into directory,
+    through a SHA-256 hasher and the size limit, without spooling it anywhere first.
+    A Content-Length over the limit is rejected before any of the body is read, and
+    the CSV header is checked as soon as the file's first line has arrived.
+    Body chunks are gathered into UPLOAD_BLOCK_BYTES blocks; parsing, hashing and
+    writing each block runs in the threadpool, off the event loop.
+    The file is stored as <sha256>.csv, so a queued job always reads the bytes it was
+    submitted for, even if another upload (in any workspace) reuses the same file name.
+    Returns (hex digest, stored path, client file name).
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    digest = hashlib.sha256()
+    # Parser callbacks run in worker threads, but never two at once (each block is awaited)
+    state = {"size": 0, "head": b"", "found": False, "in_file": False, "filename": "",
+             "header_field": b"", "header_value": b"", "headers": {}}
+    tmp_path = os.path.join(directory, f"{uuid.uuid4().hex}.part")
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"], state["header_value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        # Only the first part named `field` is kept; other form fields are skipped
+        state["in_file"] = not state["found"] and disposition.get(b"name") == field.encode()
+        if state["in_file"]:
+            state["found"] = True
+            state["filename"] = disposition.get(b"filename", b"").decode("utf-8", errors="replace")
+
+    def on_part_data(data, start, end):
+        if not state["in_file"]:
+            return
+        block = data[start:end]
+        state["size"] += len(block)
+        if state["size"] > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+        if state["head"] is not None:
+            state["head"] += block
+            if b"\n" in state["head"]:
+                check_csv_header(state["head"])
+                state["head"] = None
+        digest.update(block)
+        buffer.write(block)
+
+    def on_part_end():
+        if state["in_file"] and state["head"] is not None:
+            # Header-only (or empty) file
+            check_csv_header(state["head"])
+            state["head"] = None
+        state["in_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+    try:
+        with open(tmp_path, "wb") as buffer:
+            pending = bytearray()
+            async for chunk in request.stream():
+                pending += chunk
+                if len(pending) >= UPLOAD_BLOCK_BYTES:
+                    await run_in_threadpool(parser.write, bytes(pending))
+                    pending.clear()
+            if pending:
+                await run_in_threadpool(parser.write, bytes(pending))
+            parser.finalize()
+        if not state["found"]:
+            raise HTTPException(status_code=422, detail=f"No '{field}' file part in the upload")
+        destination = os.path.join(directory, f"{digest.hexdigest()}.csv")
+        # Same name means same bytes, so replacing an existing copy is harmless
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest(), destination, state["filename"]
+
+def job_response(job_id):
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
 
 class SimulationRequest(BaseModel):
     segment: str
@@ -53,28 +271,53 @@ class SimulationRequest(BaseModel):
     current_discount: float
     current_units: float
     price_change_pct: float
+    include_uncertainty: bool = False
+    interval: float = Field(0.9, gt=0, lt=1)
 
 # Dummy User DB
+# Hashes are precomputed (bcrypt is deliberately slow, so hashing at import delays boot).
+# Default admin password: "secret"; set ADMIN_PASSWORD_HASH to replace it.
 fake_users_db = {
     "admin": {
         "username": "admin",
-        "hashed_password": get_password_hash("secret")
+        "hashed_password": os.environ.get(
+            "ADMIN_PASSWORD_HASH", "$2b$12$uAxbEOn8AOF.ZuBwi.gQR.n5nXikciVNTTKx.Pdh.EMdS7QLKon6u")
     }
 }
 
-@app.on_event("startup")
-async def startup_event():
-    global global_df
-    print("🚀 API Startup: Generating synthetic data and training models...")
+# Set once the startup job has loaded (or trained) the default workspace's models
+warm_start_done = threading.Event()
+
+def warm_start(ctx):
+    """Loads the default workspace, training a first model pair on synthetic data if none is registered."""
     try:
+        # Warm start the default workspace from its active registered version
+        workspace = workspaces.get()
+        if workspace.current().model_version is not None:
+            metadata = workspace.registry.metadata(workspace.registry.active_version())
+            print(f"✅ Loaded model version {metadata['version']} ({metadata['rows']} rows) on startup!")
+            return
+
+        print("No registered models, generating synthetic data and training...")
         # Generate data
-        global_df = generate_synthetic_data(2000)
+        df = generate_synthetic_data(2000)
         # Train
-        revenue_model.train(global_df)
-        churn_model.train(global_df)
-        print("✅ Models trained and ready on startup!")
+        new_revenue_model, new_churn_model, timings = train_model_pair(df, n_jobs=TRAINING_CORES)
+        version = workspace.registry.register(new_revenue_model, new_churn_model, df)
+        publish_models(workspace, df, new_revenue_model, new_churn_model)
+        print(f"⏱️ Training took {timings['total']:.2f}s (revenue {timings['revenue_model']:.2f}s, churn {timings['churn_model']:.2f}s)")
+        print(f"✅ Models trained and registered as {version} on startup!")
     except Exception as e:
         print(f"❌ Startup training failed: {e}")
+    finally:
+        warm_start_done.set()
+
+@app.on_event("startup")
+async def startup_event():
+    # Model loading (and the sklearn import it implies) runs as a background job, so the
+    # server accepts requests right away; model-backed requests wait for the workspace to load
+    print("🚀 API Startup: Loading models from registry...")
+    jobs.submit("startup:default", [("warm_start", warm_start)])
 
 @app.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -88,67 +331,242 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     access_token = create_access_token(data={"sub": user["username"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.post("/upload_data")
-async def upload_data(file: UploadFile = File(...)):
-    global global_df
-    file_location = f"{DATA_DIR}/{file.filename}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Trigger processing pipeline
-    try:
-        df = preprocess_pipeline(file_location)
-        df, _, _ = perform_segmentation(df)
-        global_df = df # Update global state
-        
-        # Retrain immediately
-        revenue_model.train(df)
-        churn_model.train(df)
-        
-        return {"message": "File uploaded and processed successfully", "rows": len(df)}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# The body is parsed by receive_upload rather than FastAPI, so the form is described here for the docs
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object", "required": ["file"],
+        "properties": {"file": {"type": "string", "format": "binary"}}
+    }}}
+}
+
+@app.post("/upload_data", status_code=status.HTTP_202_ACCEPTED, openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
+async def upload_data(request: Request, sharded: bool = False, reuse_segments: bool = False,
+                      auto_segments: bool = False, append: bool = False, workspace=Depends(get_workspace)):
+    upload_hash, file_location, filename = await receive_upload(request, DATA_DIR)
+    # The cached frame is segmented, so the segmentation settings are part of its key
+    cache_key = f"{upload_hash}-auto" if auto_segments else upload_hash
+
+    # Trigger processing pipeline in the background
+    def parse(ctx):
+        ctx['df'], ctx['ingest'] = preprocess_pipeline_streaming(file_location)
+        ROWS_INGESTED.inc(len(ctx['df']), source="upload")
+
+    # Appended rows join a frame labelled by the saved segmenter, so they must use the same clusters
+    keep_segments = reuse_segments or append
 
-@app.post("/train_models")
-async def train_models():
-    global global_df
+    def segment(ctx):
+        if keep_segments and os.path.exists(workspace.segmenter_path):
+            # Assign rows to the existing clusters without refitting
+            segmenter = SegmentationModel().load(workspace.segmenter_path)
+            # Labelled by an earlier fit, so the frame must not be cached under this upload's key
+            ctx['relabelled'] = True
+            ctx['dataset_key'] = None
+        else:
+            segmenter = SegmentationModel(n_clusters="auto" if auto_segments else 3, algorithm="minibatch",
+                                          n_jobs=TRAINING_CORES)
+            segmenter.fit(ctx['df'])
+            segmenter.save(workspace.segmenter_path)
+        ctx['df'] = segmenter.assign(ctx['df'])
+        ctx['segmentation'] = {"n_clusters": segmenter.n_clusters, "selection": segmenter.selection}
+
+    def cache(ctx):
+        if not ctx.get('relabelled'):
+            dataset_cache.put(cache_key, ctx['df'])
+
+    def load_cached(ctx):
+        # Same bytes as an earlier upload: reuse its processed frame (memory-mapped)
+        ctx['df'] = dataset_cache.get(cache_key)
+        ctx['ingest'] = {"cache_hit": True, "dataset_key": cache_key}
+        ROWS_INGESTED.inc(len(ctx['df']), source="cache")
+        if keep_segments:
+            # Relabelled below, so it no longer matches the cached frame
+            ctx['dataset_key'] = None
+
+    if cache_key in dataset_cache:
+        load_stages = [("load_cached", load_cached)]
+        if keep_segments:
+            # The cached frame may have been labelled by an older segmentation
+            load_stages.append(("segment", segment))
+    else:
+        load_stages = [("parse", parse), ("segment", segment), ("cache", cache)]
+
+    def append_rows(ctx):
+        # Fold only the new rows into the current analytics instead of recomputing them
+        base = workspace.current()
+        base_df, base_analytics = base.df, base.analytics
+        if base_df is None:
+            return
+        ctx['analytics'] = base_analytics.copy().update(ctx['df'])
+        ctx['df'] = pd.concat([base_df, ctx['df']], ignore_index=True)
+        ctx['dataset_key'] = None
+
+    if append:
+        load_stages.append(("append", append_rows))
+
+    # Models already trained from this exact file: reactivate them instead of retraining
+    existing = None if sharded or append else workspace.registry.find_by_upload_hash(upload_hash)
+    if existing is not None:
+        def activate(ctx):
+            new_revenue_model, new_churn_model = RevenueModel(), ChurnModel()
+            workspace.registry.load(new_revenue_model, new_churn_model, existing['version'])
+            workspace.registry.activate(existing['version'])
+            publish_models(workspace, ctx['df'], new_revenue_model, new_churn_model,
+                           dataset_key=None if ctx.get('relabelled') else cache_key)
+            ctx['result'] = {"rows": len(ctx['df']), "model_version": existing['version'],
+                             "retrained": False, "ingest": ctx.get('ingest'),
+                             "segmentation": ctx.get('segmentation')}
+
+        job_id = jobs.submit(f"upload:{workspace.name}:{filename}", load_stages + [("activate", activate)])
+        return {"message": "File already trained, reusing models", "dataset_key": cache_key,
+                "model_version": existing['version'], "retrained": False, **job_response(job_id)}
+
+    # Appended data is not the uploaded file alone, so it can't be matched by upload hash later
+    job_id = jobs.submit(f"upload:{workspace.name}:{filename}", training_stages(workspace, load_stages, sharded=sharded),
+                         context={"upload_hash": None if append else upload_hash, "dataset_key": cache_key})
+    return {"message": "File uploaded, processing started", "dataset_key": cache_key,
+            "retrained": True, **job_response(job_id)}
+
+@app.post("/train_models", status_code=status.HTTP_202_ACCEPTED)
+async def train_models(workspace=Depends(get_workspace)):
     # Generate fresh synthetic
-    global_df = generate_synthetic_data(2000)
-    
-    revenue_model.train(global_df)
-    churn_model.train(global_df)
-    
-    return {"message": "Models trained successfully"}
+    def generate(ctx):
+        ctx['df'] = generate_synthetic_data(2000)
+        ROWS_INGESTED.inc(len(ctx['df']), source="synthetic")
+
+    job_id = jobs.submit(f"train:{workspace.name}:synthetic", training_stages(workspace, [("generate", generate)]))
+    return {"message": "Training started", **job_response(job_id)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, inference, training and dataset metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/workspaces")
+async def list_workspaces():
+    """Per-workspace memory usage plus eviction / rehydration counts."""
+    return workspaces.stats()
+
+@app.get("/models")
+async def list_models(workspace=Depends(get_workspace)):
+    return {"active": workspace.registry.active_version(), "versions": workspace.registry.list_versions()}
+
+@app.post("/models/{version}/activate")
+def activate_model(version: str, workspace=Depends(get_workspace)):
+    new_revenue_model, new_churn_model = RevenueModel(), ChurnModel()
+    metadata = workspace.registry.load(new_revenue_model, new_churn_model, version)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    workspace.registry.activate(version)
+    publish_models(workspace, None, new_revenue_model, new_churn_model)
+    return metadata
 
 @app.get("/analytics")
-async def get_analytics():
-    global global_df
-    if global_df is None:
+async def get_analytics(if_none_match: str | None = Header(None), workspace=Depends(get_workspace)):
+    snapshot = workspace.current()
+    if snapshot.analytics is None:
          # Fallback
-         global_df = generate_synthetic_data(1000)
-    
-    # Simple aggregation for charts
-    rev_by_seg = global_df.groupby('segment')['revenue'].sum().to_dict()
-    churn_rate = global_df['churned'].mean()
-    
-    # Scatter Data (Sample 100 points for performance)
-    scatter_df = global_df.sample(min(100, len(global_df)))
-    scatter_data = scatter_df[['price', 'units_sold', 'segment']].to_dict(orient='records')
-    
-    return {
-        "revenue_by_segment": rev_by_seg,
-        "total_revenue": global_df['revenue'].sum(),
-        "churn_rate": churn_rate,
-        "scatter_data": scatter_data
-    }
+         df = generate_synthetic_data(1000)
+         fallback = AnalyticsAggregates.from_frame(df)
+         snapshot = workspace.publish_snapshot(
+             lambda latest: latest if latest.analytics is not None else latest.replace(df=df, analytics=fallback))
+    current = snapshot.analytics
 
-@app.post("/simulate")
-async def simulate(request: SimulationRequest):
-    if revenue_model.model is None:
-         # Emergency auto-train
+    # Aggregates are precomputed per dataset version; clients revalidate with If-None-Match
+    etag = f'"{current.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(current.payload, headers=headers)
+
+class SurfaceRequest(BaseModel):
+    segment: str
+    current_price: float
+    current_discount: float
+    current_units: float
+    price_min: float = -50
+    price_max: float = 50
+    price_steps: int = Field(21, ge=2, le=100)
+    discount_min: float = -10
+    discount_max: float = 10
+    discount_steps: int = Field(21, ge=2, le=100)
+
+class SimulationGrid(BaseModel):
+    segment: str
+    current_price: float
+    current_discount: float
+    current_units: float
+    price_min: float = -50
+    price_max: float = 50
+    price_steps: int = Field(101, ge=1, le=10_000)
+    discount_min: float = 0
+    discount_max: float = 0
+    discount_steps: int = Field(1, ge=1, le=1_000)
+    include_uncertainty: bool = False
+    interval: float = Field(0.9, gt=0, lt=1)
+
+class BatchSimulationRequest(BaseModel):
+    scenarios: list[SimulationRequest] = []
+    grid: SimulationGrid | None = None # Evaluated after any explicit scenarios
+    chunk_size: int = Field(512, ge=1, le=10_000)
+
+class PortfolioRequest(BaseModel):
+    policy: dict[str, float] # group -> % price change
+    policy_column: str = 'segment' # or 'segment_cluster' after segmentation
+    discount_change_pct: float = 0.0
+
+def ensure_models_trained(workspace):
+    """
+    The workspace's serving snapshot, read without locking. If it has no models yet,
+    emergency-trains fresh ones on synthetic data and publishes them as a new snapshot.
+    May block (waiting for the startup job, or training); async handlers use serving_snapshot().
+    """
+    snapshot = workspace.current()
+    if snapshot.model_version is not None:
+        return snapshot
+    if workspace.name == WorkspaceManager.DEFAULT and not warm_start_done.is_set():
+        # The startup job is still loading or training these models; don't train a second pair
+        warm_start_done.wait()
+        snapshot = workspace.current()
+        if snapshot.model_version is not None:
+            return snapshot
+
+    # One emergency training run per workspace; concurrent callers wait for it instead of
+    # training their own. publish_lock is only taken for the swap, so unloads don't block on it.
+    with workspace.training_lock:
+        snapshot = workspace.current()
+        if snapshot.model_version is not None:
+            return snapshot
+        # Emergency auto-train
         df = generate_synthetic_data(1000)
-        revenue_model.train(df)
-        churn_model.train(df)
+        new_revenue_model, new_churn_model = RevenueModel(), ChurnModel()
+        new_revenue_model.train(df)
+        new_churn_model.train(df)
+
+        def swap(latest):
+            if latest.model_version is not None:
+                return latest
+            return latest.replace(revenue_model=new_revenue_model, churn_model=new_churn_model)
+
+        return workspace.publish_snapshot(swap)
+
+async def serving_snapshot(workspace):
+    """ensure_models_trained for async handlers: the usual case returns at once, waiting or training runs in the threadpool."""
+    snapshot = workspace.current()
+    if snapshot.model_version is not None:
+        return snapshot
+    return await run_in_threadpool(ensure_models_trained, workspace)
+
+@app.post("/simulate")
+async def simulate(request: SimulationRequest, workspace=Depends(get_workspace)):
+    simulator = (await serving_snapshot(workspace)).simulator
         
     summary = {
         'segment': request.segment,
@@ -158,19 +576,131 @@ async def simulate(request: SimulationRequest):
     }
     
     result = simulator.simulate_scenario(summary, request.price_change_pct)
+    if request.include_uncertainty:
+        bands = simulator.simulate_uncertainty(summary, request.price_change_pct, interval=request.interval)
+        result.update({key: float(value) for key, value in bands.iloc[0].items()
+                       if key.endswith(('_low', '_high'))})
+        result['interval'] = request.interval
     return result
 
+@app.get("/simulate/cache")
+async def simulate_cache_stats(workspace=Depends(get_workspace)):
+    return workspace.current().simulator.cache_stats()
+
+@app.post("/simulate/surface")
+async def simulate_surface(request: SurfaceRequest, workspace=Depends(get_workspace)):
+    simulator = (await serving_snapshot(workspace)).simulator
+
+    summary = {
+        'segment': request.segment,
+        'avg_price': request.current_price,
+        'avg_discount': request.current_discount,
+        'avg_units': request.current_units
+    }
+
+    price_changes = np.linspace(request.price_min, request.price_max, request.price_steps)
+    discount_changes = np.linspace(request.discount_min, request.discount_max, request.discount_steps)
+    surface = simulator.simulate_surface(summary, price_changes, discount_changes)
+
+    # Rows follow price_changes, columns follow discount_changes
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in surface.items()}
+
+def batch_scenarios(request):
+    """Lazily expands a BatchSimulationRequest into simulator scenario dicts."""
+    for item in request.scenarios:
+        yield {'segment': item.segment, 'avg_price': item.current_price,
+               'avg_discount': item.current_discount, 'avg_units': item.current_units,
+               'price_change_pct': item.price_change_pct,
+               'include_uncertainty': item.include_uncertainty, 'interval': item.interval}
+
+    grid = request.grid
+    if grid is not None:
+        for price_change in np.linspace(grid.price_min, grid.price_max, grid.price_steps).tolist():
+            for discount_change in np.linspace(grid.discount_min, grid.discount_max, grid.discount_steps).tolist():
+                yield {'segment': grid.segment, 'avg_price': grid.current_price,
+                       'avg_discount': grid.current_discount, 'avg_units': grid.current_units,
+                       'price_change_pct': price_change, 'discount_change_pct': discount_change,
+                       'include_uncertainty': grid.include_uncertainty, 'interval': grid.interval}
+
+@app.post("/simulate/batch")
+async def simulate_batch(request: BatchSimulationRequest, workspace=Depends(get_workspace)):
+    """
+    Evaluates many scenarios (an explicit list and/or a price x discount grid) with batched
+    inference and streams one JSON object per line as each chunk completes.
+    """
+    # Pin the simulator so a model swap mid-stream can't mix versions in one response
+    batch_simulator = (await serving_snapshot(workspace)).simulator
+
+    # Errors can't be reported once streaming has started, so check segments up front
+    shards = getattr(batch_simulator.revenue_model, "shards", None)
+    if shards is not None:
+        segments = {item.segment for item in request.scenarios}
+        if request.grid is not None:
+            segments.add(request.grid.segment)
+        unknown = sorted(segments - set(shards.segments))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"No model shard for segment: {', '.join(unknown)}")
+
+    def lines():
+        # Sync generator: Starlette iterates it in the threadpool, off the event loop.
+        # One body message per chunk keeps per-message overhead off every scenario.
+        results = batch_simulator.iter_simulations(batch_scenarios(request), chunk_size=request.chunk_size)
+        while chunk := list(islice(results, request.chunk_size)):
+            yield "".join(json.dumps(result) + "\n" for result in chunk)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/simulate/portfolio")
+def simulate_portfolio_rollout(request: PortfolioRequest, workspace=Depends(get_workspace)):
+    # Plain def: FastAPI runs it in the threadpool so a large rollout doesn't block the event loop
+    # One snapshot for the whole rollout: dataset and models always belong together
+    snapshot = ensure_models_trained(workspace)
+    df = snapshot.df
+    if df is None:
+        raise HTTPException(status_code=400, detail="No dataset loaded")
+    if request.policy_column not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{request.policy_column}' not in dataset")
+
+    return simulate_portfolio(
+        df, snapshot.revenue_model, snapshot.churn_model, request.policy,
+        policy_column=request.policy_column,
+        discount_change_pct=request.discount_change_pct,
+        n_jobs=os.cpu_count() or 1
+    )
+
 class ReportRequest(BaseModel):
     results: dict
 
+def report_key(results):
+    """Content hash of a results payload; key order doesn't matter."""
+    payload = json.dumps(results, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def iter_bytes(data, chunk_size=REPORT_CHUNK_BYTES):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
 @app.post("/generate_report")
 async def generate_report(request: ReportRequest):
-    try:
-        filename = "strategy_report.pdf"
-        filepath = os.path.join(REPORTS_DIR, filename)
-        # The generator expects a list of scenarios
-        generate_pdf_report([request.results], filepath)
-        
-        return FileResponse(filepath, media_type='application/pdf', filename=filename)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # reportlab is only imported once a report is actually requested
+    from reports.report_generator import render_pdf_report
+    key = report_key(request.results)
+    pdf = report_cache.get(key)
+    cache_status = "hit" if pdf is not None else "miss"
+    if pdf is None:
+        try:
+            # The generator expects a list of scenarios
+            pdf = await asyncio.get_running_loop().run_in_executor(report_pool, render_pdf_report, [request.results])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        report_cache.put(key, pdf)
+
+    # Each distinct payload gets its own file name; nothing is written to a shared path
+    filename = f"strategy_report_{key[:12]}.pdf"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Content-Length": str(len(pdf)),
+        "ETag": f'"{key}"',
+        "X-Report-Cache": cache_status
+    }
+    return StreamingResponse(iter_bytes(pdf), media_type='application/pdf', headers=headers)
@@ -0,0 +1,57 @@
+"""
+Compares the sklearn Pipeline path with the compiled fast path.
+Run from the repo root: python -m benchmarks.inference_benchmark
+"""
+import time
+import numpy as np
+import pandas as pd
+from services.data_generator import generate_synthetic_data
+from models.revenue_model import RevenueModel
+from models.churn_model import ChurnModel
+
+def time_call(fn, repeat):
+    fn() # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def pipeline_demand(model, segments, prices, discounts):
+    data = pd.DataFrame({'segment': segments, 'price': prices, 'discount_percent': discounts})
+    return model.model.predict(data)
+
+def pipeline_churn(model, segments, prices, discounts, units):
+    data = pd.DataFrame({'segment': segments, 'price': prices, 'discount_percent': discounts, 'units_sold': units})
+    return model.model.predict_proba(data)[:, 1]
+
+def main():
+    df = generate_synthetic_data(2000)
+    revenue_model = RevenueModel()
+    revenue_model.train(df)
+    churn_model = ChurnModel()
+    churn_model.train(df)
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>8} {'model':>8} {'pipeline ms':>12} {'compiled ms':>12} {'speedup':>8} {'max |diff|':>11}")
+    for n_rows in [1, 10, 1000, 100_000]:
+        sample = df.sample(n_rows, replace=True, random_state=0)
+        segments = sample['segment'].to_numpy(dtype=object)
+        prices = sample['price'].to_numpy() * rng.uniform(0.5, 2.0, n_rows)
+        discounts = sample['discount_percent'].to_numpy()
+        units = sample['units_sold'].to_numpy(dtype=float)
+        repeat = max(1, 200 // n_rows)
+
+        slow = pipeline_demand(revenue_model, segments, prices, discounts)
+        fast = revenue_model.predictor.predict(segments, prices, discounts)
+        t_slow = time_call(lambda: pipeline_demand(revenue_model, segments, prices, discounts), repeat)
+        t_fast = time_call(lambda: revenue_model.predictor.predict(segments, prices, discounts), repeat)
+        print(f"{n_rows:>8} {'demand':>8} {t_slow * 1e3:>12.3f} {t_fast * 1e3:>12.3f} {t_slow / t_fast:>7.1f}x {np.abs(slow - fast).max():>11.2g}")
+
+        slow = pipeline_churn(churn_model, segments, prices, discounts, units)
+        fast = churn_model.predictor.predict(segments, prices, discounts, units)
+        t_slow = time_call(lambda: pipeline_churn(churn_model, segments, prices, discounts, units), repeat)
+        t_fast = time_call(lambda: churn_model.predictor.predict(segments, prices, discounts, units), repeat)
+        print(f"{n_rows:>8} {'churn':>8} {t_slow * 1e3:>12.3f} {t_fast * 1e3:>12.3f} {t_slow / t_fast:>7.1f}x {np.abs(slow - fast).max():>11.2g}")
+
+if __name__ == "__main__":
+    main()
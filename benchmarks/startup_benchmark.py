@@ -0,0 +1,74 @@
+"""
+Checks the API's cold-start budget: time to import app.main, time until the first
+request is answered (import + startup + GET /metrics), and that no heavy module is
+imported before it is needed. Each run uses a fresh interpreter.
+Run from the repo root: python -m benchmarks.startup_benchmark [--import-budget S] [--first-request-budget S]
+Exits with status 1 if a budget is exceeded, so it can gate CI.
+"""
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+IMPORT_BUDGET_SECONDS = 2.0
+FIRST_REQUEST_BUDGET_SECONDS = 3.0
+# Must stay unimported until a request needs them (training, model loading, reports)
+HEAVY_MODULES = ['sklearn', 'scipy', 'joblib', 'reportlab']
+
+def measure():
+    """Runs inside the fresh interpreter; prints timings as JSON."""
+    start = time.perf_counter()
+    import app.main
+    import_seconds = time.perf_counter() - start
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    # The test client itself is not part of the budget
+    from fastapi.testclient import TestClient
+    start_request = time.perf_counter()
+    with TestClient(app.main.app) as client:
+        status = client.get("/metrics").status_code
+        first_request_seconds = import_seconds + time.perf_counter() - start_request
+        # Informational: models load (or train, on an empty registry) in the background
+        app.main.warm_start_done.wait()
+        models_ready_seconds = import_seconds + time.perf_counter() - start_request
+
+    print(json.dumps({"import_seconds": import_seconds, "first_request_seconds": first_request_seconds,
+                      "models_ready_seconds": models_ready_seconds, "status": status,
+                      "heavy_modules_at_import": heavy}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_SECONDS)
+    parser.add_argument("--first-request-budget", type=float, default=FIRST_REQUEST_BUDGET_SECONDS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure()
+        return
+
+    output = subprocess.run([sys.executable, "-m", "benchmarks.startup_benchmark", "--child"],
+                            capture_output=True, text=True, check=True).stdout
+    # The warm-start job may still be logging after the result line
+    result = json.loads(next(line for line in output.splitlines() if line.startswith("{")))
+
+    failures = []
+    if result["import_seconds"] > args.import_budget:
+        failures.append(f"import took {result['import_seconds']:.2f}s (budget {args.import_budget:.2f}s)")
+    if result["first_request_seconds"] > args.first_request_budget:
+        failures.append(f"first request after {result['first_request_seconds']:.2f}s "
+                        f"(budget {args.first_request_budget:.2f}s)")
+    if result["status"] != 200:
+        failures.append(f"first request returned {result['status']}")
+    if result["heavy_modules_at_import"]:
+        failures.append(f"imported at startup: {', '.join(result['heavy_modules_at_import'])}")
+
+    print(f"import app.main:   {result['import_seconds']:.3f}s (budget {args.import_budget:.2f}s)")
+    print(f"first request:     {result['first_request_seconds']:.3f}s (budget {args.first_request_budget:.2f}s)")
+    print(f"models ready:      {result['models_ready_seconds']:.3f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -390,6 +390,22 @@ function StrategyExport({ results }) {
   )
 }
 
+// --- Background Jobs ---
+
+// Training runs as a background job; poll its status_url until it finishes
+async function waitForJob(statusUrl, intervalMs = 1000) {
+  while (true) {
+    const { data: job } = await axios.get(`http://localhost:8000${statusUrl}`);
+    if (job.status === 'succeeded') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Job failed');
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
+function errorMessage(error) {
+  return error.response?.data?.detail || error.message;
+}
+
 // --- Main App Root ---
 
 export default function App() {
@@ -434,10 +450,11 @@ export default function App() {
   const handleTrain = async () => {
     setTrainLoading(true);
     try {
-      await axios.post('http://localhost:8000/train_models');
+      const response = await axios.post('http://localhost:8000/train_models');
+      await waitForJob(response.data.status_url);
       alert("✅ Data Generated & Models Retrained!");
     } catch (error) {
-      alert("Training failed");
+      alert(`Training failed: ${errorMessage(error)}`);
     }
     setTrainLoading(false);
   };
@@ -447,12 +464,14 @@ export default function App() {
     formData.append('file', file);
     try {
       setTrainLoading(true);
-      await axios.post('http://localhost:8000/upload_data', formData, {
+      const response = await axios.post('http://localhost:8000/upload_data', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
       });
+      // Processed (or, for an already trained file, reactivated) in a background job
+      await waitForJob(response.data.status_url);
       alert("✅ File Uploaded & Processed!");
     } catch (error) {
-      alert("Upload failed");
+      alert(`Upload failed: ${errorMessage(error)}`);
     }
     setTrainLoading(false);
   };
@@ -0,0 +1,103 @@
+import numpy as np
+
+class SegmentEncoder:
+    """Fixed one-hot layout for the segment column, taken from a fitted OneHotEncoder."""
+
+    def __init__(self, categories):
+        self.categories = np.asarray(categories, dtype=object)
+        self.index = {category: i for i, category in enumerate(self.categories)}
+
+    def encode(self, segment, n_rows):
+        """
+        One-hot rows for a single segment or one segment per row.
+        Unknown segments encode to all zeros, like OneHotEncoder(handle_unknown='ignore').
+        """
+        onehot = np.zeros((n_rows, len(self.categories)))
+        if np.ndim(segment) == 0:
+            column = self.index.get(segment)
+            if column is not None:
+                onehot[:, column] = 1
+            return onehot
+
+        segments = np.asarray(segment, dtype=object).ravel()
+        for column, category in enumerate(self.categories):
+            onehot[:, column] = segments == category
+        return onehot
+
+def _broadcast(*arrays):
+    return np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in arrays))
+
+class CompiledDemandPredictor:
+    """
+    Pandas-free view of the fitted RevenueModel pipeline.
+    Builds the [price, discount_percent, one-hot segment] matrix directly and sums the
+    trees in the same order as RandomForestRegressor.predict, so results are identical.
+    """
+
+    def __init__(self, pipeline):
+        preprocessor = pipeline.named_steps['preprocessor']
+        self.encoder = SegmentEncoder(preprocessor.named_transformers_['cat'].categories_[0])
+        self.forest = pipeline.named_steps['regressor']
+        self.trees = [estimator.tree_ for estimator in self.forest.estimators_]
+
+        # Node values of every tree padded into one (n_trees, max_nodes) table
+        self.leaf_values = np.zeros((len(self.trees), max(tree.node_count for tree in self.trees)))
+        for i, tree in enumerate(self.trees):
+            self.leaf_values[i, :tree.node_count] = tree.value[:, 0, 0]
+
+    def features(self, segment, prices, discount_percents):
+        prices, discount_percents = _broadcast(prices, discount_percents)
+        n_rows = prices.size
+        X = np.empty((n_rows, 2 + len(self.encoder.categories)), dtype=np.float32)
+        X[:, 0] = prices.ravel()
+        X[:, 1] = discount_percents.ravel()
+        X[:, 2:] = self.encoder.encode(segment, n_rows)
+        return X, prices.shape
+
+    def predict(self, segment, prices, discount_percents):
+        """Raw forest prediction (units sold), shaped like the broadcast inputs."""
+        X, shape = self.features(segment, prices, discount_percents)
+        y = np.zeros(X.shape[0])
+        for tree in self.trees:
+            y += tree.predict(X)[:, 0]
+        y /= len(self.trees)
+        return y.reshape(shape)
+
+    def predict_trees(self, segment, prices, discount_percents):
+        """Per-tree predictions, shape (n_trees, *broadcast shape), via one apply and one gather."""
+        X, shape = self.features(segment, prices, discount_percents)
+        leaves = self.forest.apply(X)
+        per_tree = self.leaf_values[np.arange(len(self.trees)), leaves].T
+        return per_tree.reshape((-1,) + shape)
+
+class CompiledChurnPredictor:
+    """
+    Pandas-free view of the fitted ChurnModel pipeline.
+    Evaluates the standardized linear form of the LogisticRegression directly.
+    """
+
+    def __init__(self, pipeline):
+        preprocessor = pipeline.named_steps['preprocessor']
+        scaler = preprocessor.named_transformers_['num']
+        self.mean = scaler.mean_
+        self.scale = scaler.scale_
+        self.encoder = SegmentEncoder(preprocessor.named_transformers_['cat'].categories_[0])
+        classifier = pipeline.named_steps['classifier']
+        self.coef = classifier.coef_
+        self.intercept = classifier.intercept_
+
+    def predict(self, segment, prices, discount_percents, units_sold):
+        """Churn probability (positive class), shaped like the broadcast inputs."""
+        prices, discount_percents, units_sold = _broadcast(prices, discount_percents, units_sold)
+        n_rows = prices.size
+        X = np.empty((n_rows, 3 + len(self.encoder.categories)))
+        X[:, 0] = prices.ravel()
+        X[:, 1] = discount_percents.ravel()
+        X[:, 2] = units_sold.ravel()
+        X[:, :3] -= self.mean
+        X[:, :3] /= self.scale
+        X[:, 3:] = self.encoder.encode(segment, n_rows)
+
+        decision = (X @ self.coef.T + self.intercept).ravel()
+        # Logistic function via tanh: exact, overflow-free, and avoids importing scipy
+        return (0.5 + 0.5 * np.tanh(0.5 * decision)).reshape(prices.shape)
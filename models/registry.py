@@ -0,0 +1,142 @@
+import os
+import json
+import shutil
+import hashlib
+import uuid
+import pickle
+from datetime import datetime
+import pandas as pd
+
+def dataset_hash(df):
+    """Stable content hash of a training DataFrame (columns + row values)."""
+    digest = hashlib.sha256()
+    digest.update(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class _ByteCounter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        # Protocol 5 hands large array buffers over as PickleBuffer objects
+        self.size += memoryview(data).nbytes
+
+def pickled_size(obj):
+    """Size of obj's pickle in bytes, counted while streaming (no copy is kept)."""
+    counter = _ByteCounter()
+    pickle.dump(obj, counter, protocol=pickle.HIGHEST_PROTOCOL)
+    return counter.size
+
+class ModelRegistry:
+    """
+    Local on-disk registry of trained model pairs.
+    Layout: <root>/<version>/{revenue.joblib, churn.joblib, metadata.json} plus an ACTIVE pointer file.
+    Versions are written to a temp dir and renamed into place, so readers never see partial artifacts.
+    """
+
+    REVENUE_FILE = "revenue.joblib"
+    CHURN_FILE = "churn.joblib"
+    METADATA_FILE = "metadata.json"
+    ACTIVE_FILE = "ACTIVE"
+
+    def __init__(self, root="data/models"):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def register(self, revenue_model, churn_model, df, activate=True, data_hash=None, upload_hash=None):
+        """
+        Persists a trained model pair with its metadata and returns the new version id.
+        upload_hash records the hash of the raw uploaded file the data came from, if any.
+        """
+        trained_at = datetime.utcnow()
+        version = f"v{trained_at.strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+        metadata = {
+            "version": version,
+            "data_hash": data_hash or dataset_hash(df),
+            "upload_hash": upload_hash,
+            "trained_at": trained_at.isoformat() + "Z",
+            "rows": len(df),
+            "metrics": {
+                "revenue": revenue_model.metrics,
+                "churn": churn_model.metrics
+            }
+        }
+
+        staging = os.path.join(self.root, f".{version}.tmp")
+        os.makedirs(staging)
+        try:
+            revenue_model.save(os.path.join(staging, self.REVENUE_FILE))
+            churn_model.save(os.path.join(staging, self.CHURN_FILE))
+            with open(os.path.join(staging, self.METADATA_FILE), "w") as f:
+                json.dump(metadata, f, indent=2)
+            os.rename(staging, os.path.join(self.root, version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def metadata(self, version):
+        path = os.path.join(self.root, version, self.METADATA_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def list_versions(self):
+        """All registered versions, oldest first, each flagged with whether it is active."""
+        active = self.active_version()
+        versions = []
+        for name in sorted(os.listdir(self.root)):
+            metadata = self.metadata(name) if not name.startswith(".") else None
+            if metadata is not None:
+                metadata["active"] = name == active
+                versions.append(metadata)
+        return versions
+
+    def latest_version(self):
+        versions = [name for name in sorted(os.listdir(self.root))
+                    if not name.startswith(".") and self.metadata(name) is not None]
+        return versions[-1] if versions else None
+
+    def active_version(self):
+        """The activated version, falling back to the newest one."""
+        path = os.path.join(self.root, self.ACTIVE_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                version = f.read().strip()
+            if self.metadata(version) is not None:
+                return version
+        return self.latest_version()
+
+    def activate(self, version):
+        if self.metadata(version) is None:
+            raise KeyError(f"Unknown model version: {version}")
+        tmp_path = os.path.join(self.root, f".{self.ACTIVE_FILE}.{uuid.uuid4().hex}")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, self.ACTIVE_FILE))
+
+    def find_by_upload_hash(self, upload_hash):
+        """Newest registered version trained from exactly this uploaded file, if any."""
+        matches = [m for m in self.list_versions() if m.get("upload_hash") == upload_hash]
+        return matches[-1] if matches else None
+
+    def load(self, revenue_model, churn_model, version=None):
+        """
+        Loads a version (default: the active one) into the given models.
+        Returns its metadata, or None when nothing is registered.
+        """
+        version = version or self.active_version()
+        metadata = self.metadata(version) if version else None
+        if metadata is None:
+            return None
+
+        revenue_model.load(os.path.join(self.root, version, self.REVENUE_FILE))
+        churn_model.load(os.path.join(self.root, version, self.CHURN_FILE))
+        revenue_model.metrics = metadata["metrics"]["revenue"]
+        churn_model.metrics = metadata["metrics"]["churn"]
+        return metadata
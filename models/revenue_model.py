@@ -1,19 +1,36 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-import joblib
+from models.registry import pickled_size
+from models.compiled import CompiledDemandPredictor
+from models.surrogate import DemandSurrogate
+import os
+import uuid
+import time
+
+# Rows used to report train_r2; scoring the full set costs about as much as a second fit
+SCORE_SAMPLE_ROWS = 20_000
 
 class RevenueModel:
     def __init__(self):
         self.model = None
+        self.version = None # Changes on every train/load so caches can key on it
         self.preprocessor = None
+        self.predictor = None # Compiled fast path, rebuilt on train/load
+        self.metrics = {}
+        self.memory_bytes = 0 # Approximate size of the fitted model, measured once on train/load
+        self.surrogate = None # Optional fast approximation, see fit_surrogate
         
-    def train(self, df):
-        """Trains the model to predict units_sold based on price and segment."""
+    def train(self, df, n_jobs=None):
+        """
+        Trains the model to predict units_sold based on price and segment.
+        n_jobs: cores used to build the forest (None = 1, -1 = all).
+        """
+        # sklearn is imported on first training, so importing the API stays fast
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.preprocessing import OneHotEncoder
+        from sklearn.compose import ColumnTransformer
+        from sklearn.pipeline import Pipeline
+
         X = df[['segment', 'price', 'discount_percent']]
         y = df['units_sold']
         
@@ -31,30 +48,106 @@ class RevenueModel:
         # Model pipeline
         self.model = Pipeline(steps=[
             ('preprocessor', self.preprocessor),
-            ('regressor', RandomForestRegressor(n_estimators=100, random_state=42))
+            ('regressor', RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs))
         ])
         
+        start = time.perf_counter()
         self.model.fit(X, y)
+        train_seconds = time.perf_counter() - start
+        # Fit quality on a bounded sample, still on the training cores, so large
+        # uploads don't pay a full single-core pass over every tree
+        if len(X) > SCORE_SAMPLE_ROWS:
+            sample = X.sample(n=SCORE_SAMPLE_ROWS, random_state=42).index
+            train_r2 = self.model.score(X.loc[sample], y.loc[sample])
+        else:
+            train_r2 = self.model.score(X, y)
+        # Training cores shouldn't follow the model into serving
+        self.model.named_steps['regressor'].n_jobs = None
+        self.predictor = CompiledDemandPredictor(self.model)
+        self.surrogate = None # Distilled from the old forest, no longer valid
+        self.metrics = {
+            'train_r2': float(train_r2),
+            'train_seconds': train_seconds,
+            'rows': len(df)
+        }
+        self.version = uuid.uuid4().hex
+        self.memory_bytes = pickled_size(self.model)
         print("Revenue Model Trained.")
         
-    def predict_demand(self, segment, price, discount_percent):
-        """Predicts units sold for a given scenario."""
-        data = pd.DataFrame({
-            'segment': [segment],
-            'price': [price],
-            'discount_percent': [discount_percent]
-        })
-        predicted_units = self.model.predict(data)[0]
+    def fit_surrogate(self, df, **kwargs):
+        """
+        Distils the trained forest into per-segment demand tables for microsecond queries.
+        Returns the surrogate; its fidelity attribute holds the error vs the forest per segment.
+        """
+        self.surrogate = DemandSurrogate(**kwargs).fit(self.predictor, df)
+        return self.surrogate
+
+    def predict_demand(self, segment, price, discount_percent, mode="exact"):
+        """
+        Predicts units sold for a given scenario.
+        mode="fast" answers from the surrogate when one is fitted and the query is in range.
+        """
+        predicted_units = None
+        if mode == "fast" and self.surrogate is not None:
+            predicted_units = self.surrogate.predict_one(segment, price, discount_percent)
+        if predicted_units is None:
+            predicted_units = float(self.predictor.predict(segment, price, discount_percent))
         predicted_units = max(0, predicted_units) # Check non-negative
         
         predicted_revenue = predicted_units * price * (1 - discount_percent)
         return predicted_units, predicted_revenue
 
+    def predict_demand_batch(self, segment, prices, discount_percents, mode="exact"):
+        """
+        Predicts units sold for many scenarios in a single vectorized call.
+        segment can be a single segment name or one name per row.
+        mode="fast" uses the surrogate where it covers the query and the forest elsewhere.
+        Returns (units, revenue) as NumPy arrays.
+        """
+        prices, discount_percents = np.broadcast_arrays(
+            np.asarray(prices, dtype=float),
+            np.asarray(discount_percents, dtype=float)
+        )
+        if mode == "fast" and self.surrogate is not None:
+            predicted_units, covered = self.surrogate.predict(segment, prices, discount_percents)
+            if not covered.all():
+                missing = ~covered
+                segments = segment if np.ndim(segment) == 0 else np.broadcast_to(
+                    np.asarray(segment, dtype=object), prices.shape)[missing]
+                predicted_units[missing] = self.predictor.predict(segments, prices[missing], discount_percents[missing])
+        else:
+            predicted_units = self.predictor.predict(segment, prices, discount_percents)
+        predicted_units = np.maximum(0, predicted_units)
+
+        predicted_revenue = predicted_units * prices * (1 - discount_percents)
+        return predicted_units, predicted_revenue
+
+    def predict_demand_trees(self, segment, prices, discount_percents):
+        """
+        Predicts units sold with every tree of the forest in one vectorized pass.
+        Returns (units, revenue) arrays of shape (n_trees, *prices.shape); their mean
+        over the first axis is the regular forest prediction.
+        """
+        prices, discount_percents = np.broadcast_arrays(
+            np.asarray(prices, dtype=float),
+            np.asarray(discount_percents, dtype=float)
+        )
+        predicted_units = np.maximum(0, self.predictor.predict_trees(segment, prices, discount_percents))
+
+        predicted_revenue = predicted_units * prices * (1 - discount_percents)
+        return predicted_units, predicted_revenue
+
     def save(self, filepath):
+        import joblib
         joblib.dump(self.model, filepath)
         
     def load(self, filepath):
+        import joblib
         self.model = joblib.load(filepath)
+        self.memory_bytes = os.path.getsize(filepath)
+        self.predictor = CompiledDemandPredictor(self.model)
+        self.surrogate = None
+        self.version = uuid.uuid4().hex
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from models.revenue_model import RevenueModel
+from models.churn_model import ChurnModel
+from models.registry import dataset_hash
+
+# Only these columns feed the models, so only they decide whether a shard is stale
+SHARD_COLUMNS = ['segment', 'price', 'discount_percent', 'units_sold', 'churned']
+
+class UnknownSegmentError(KeyError):
+    """Raised when a segment has no trained shard (there is no global model to fall back to)."""
+
+class ShardedModels:
+    """
+    Independent RevenueModel/ChurnModel pairs per segment.
+    Each shard is persisted in its own directory under root and tracked in manifest.json
+    with the hash of its segment's data; shards are loaded lazily on first query.
+    revenue_model / churn_model expose the usual model interface, routing by segment,
+    so they can be handed straight to PricingSimulator.
+    train() updates this store in place, so serve from a view(): a frozen copy that later
+    training runs don't touch. Shard directories are versioned by their data hash, so a
+    view can still load its own shards from disk after the next retrain; directories no
+    longer referenced by the current or previous manifest are removed.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, root="data/shards", manifest=None, loaded=None):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest = manifest if manifest is not None else self._read_manifest()
+        self._loaded = dict(loaded or {})
+        self._lock = threading.Lock()
+        self.revenue_model = ShardedRevenueModel(self)
+        self.churn_model = ShardedChurnModel(self)
+
+    @property
+    def version(self):
+        """Changes whenever any shard is retrained."""
+        return self.manifest.get("version")
+
+    @property
+    def segments(self):
+        return sorted(self.manifest.get("shards", {}))
+
+    def view(self):
+        """A copy of the current manifest and loaded shards, unaffected by later train() calls."""
+        with self._lock:
+            return ShardedModels(self.root, manifest=self.manifest, loaded=self._loaded)
+
+    def train(self, df, n_jobs=None, force=False):
+        """
+        Retrains, in parallel, only the shards whose segment data changed (or all with force=True).
+        Segments missing from df are dropped, so they are no longer served.
+        Returns which segments were trained, skipped or dropped and the wall-clock time.
+        """
+        start = time.perf_counter()
+        shards = self.manifest.get("shards", {})
+        changed = {}
+        skipped = []
+        for segment, seg_df in df[SHARD_COLUMNS].groupby('segment', observed=True):
+            segment = str(segment)
+            data_hash = dataset_hash(seg_df)
+            if not force and shards.get(segment, {}).get("data_hash") == data_hash:
+                skipped.append(segment)
+            else:
+                changed[segment] = (seg_df, data_hash)
+        dropped = sorted(set(shards) - set(changed) - set(skipped))
+
+        def train_shard(segment):
+            seg_df, data_hash = changed[segment]
+            revenue_model, churn_model = RevenueModel(), ChurnModel()
+            revenue_model.train(seg_df)
+            churn_model.train(seg_df)
+
+            # New data gets a new directory, so files a published view may still load stay unchanged
+            directory = os.path.join(self.root, f"{hashlib.sha1(segment.encode()).hexdigest()[:12]}-{data_hash[:12]}")
+            os.makedirs(directory, exist_ok=True)
+            revenue_model.save(os.path.join(directory, "revenue.joblib"))
+            churn_model.save(os.path.join(directory, "churn.joblib"))
+            entry = {
+                "directory": os.path.basename(directory),
+                "data_hash": data_hash,
+                "rows": len(seg_df),
+                "trained_at": datetime.utcnow().isoformat() + "Z"
+            }
+            return segment, entry, (revenue_model, churn_model)
+
+        with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count() or 1) as pool:
+            results = list(pool.map(train_shard, changed))
+
+        with self._lock:
+            previous = self.manifest.get("shards", {})
+            shards = {segment: entry for segment, entry in previous.items() if segment not in dropped}
+            for segment in dropped:
+                self._loaded.pop(segment, None)
+            for segment, entry, models in results:
+                shards[segment] = entry
+                self._loaded[segment] = models
+            self.manifest = {"version": uuid.uuid4().hex if results or dropped else self.version, "shards": shards}
+            self._write_manifest()
+            # Views of the previous manifest may still be serving, so only older directories go
+            self._remove_unreferenced(list(previous.values()) + list(shards.values()))
+
+        return {"trained": sorted(changed), "skipped": sorted(skipped), "dropped": dropped,
+                "seconds": time.perf_counter() - start}
+
+    def shard(self, segment):
+        """The (RevenueModel, ChurnModel) pair for a segment, loading it from disk on first use."""
+        segment = str(segment)
+        models = self._loaded.get(segment)
+        if models is not None:
+            return models
+
+        with self._lock:
+            if segment not in self._loaded:
+                entry = self.manifest.get("shards", {}).get(segment)
+                if entry is None:
+                    raise UnknownSegmentError(f"No model shard for segment: {segment}")
+                directory = os.path.join(self.root, entry["directory"])
+                revenue_model, churn_model = RevenueModel(), ChurnModel()
+                revenue_model.load(os.path.join(directory, "revenue.joblib"))
+                churn_model.load(os.path.join(directory, "churn.joblib"))
+                self._loaded[segment] = (revenue_model, churn_model)
+            return self._loaded[segment]
+
+    def route(self, segment, fn, *arrays):
+        """
+        Calls fn(shard, segment, *arrays) per segment and stitches the results back in row order.
+        Results may be arrays or tuples of arrays whose last axis is the row axis.
+        """
+        arrays = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in arrays))
+        shape = arrays[0].shape
+        if np.ndim(segment) == 0:
+            return fn(self.shard(segment), segment, *arrays)
+
+        segments = np.broadcast_to(np.asarray(segment, dtype=object), shape).ravel()
+        flat = [a.ravel() for a in arrays]
+        outputs = None
+        for name in pd.unique(segments):
+            rows = segments == name
+            result = fn(self.shard(name), name, *(a[rows] for a in flat))
+            parts = result if isinstance(result, tuple) else (result,)
+            if outputs is None:
+                outputs = [np.empty(part.shape[:-1] + (len(segments),)) for part in parts]
+            for out, part in zip(outputs, parts):
+                out[..., rows] = part
+
+        if outputs is None:
+            outputs = [np.empty((0,))]
+        outputs = [out.reshape(out.shape[:-1] + shape) for out in outputs]
+        return tuple(outputs) if len(outputs) > 1 else outputs[0]
+
+    def _remove_unreferenced(self, entries):
+        """Deletes shard directories under root that none of the given manifest entries use."""
+        keep = {entry["directory"] for entry in entries}
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name not in keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _read_manifest(self):
+        path = os.path.join(self.root, self.MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {"version": None, "shards": {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        path = os.path.join(self.root, self.MANIFEST_FILE)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+class ShardedRevenueModel:
+    """RevenueModel interface over per-segment shards."""
+
+    surrogate = None
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    @property
+    def version(self):
+        return self.shards.version
+
+    def predict_demand(self, segment, price, discount_percent, mode="exact"):
+        return self.shards.shard(segment)[0].predict_demand(segment, price, discount_percent, mode=mode)
+
+    def predict_demand_batch(self, segment, prices, discount_percents, mode="exact"):
+        return self.shards.route(
+            segment, lambda models, seg, p, d: models[0].predict_demand_batch(seg, p, d, mode=mode),
+            prices, discount_percents)
+
+    def predict_demand_trees(self, segment, prices, discount_percents):
+        return self.shards.route(
+            segment, lambda models, seg, p, d: models[0].predict_demand_trees(seg, p, d),
+            prices, discount_percents)
+
+class ShardedChurnModel:
+    """ChurnModel interface over per-segment shards."""
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    @property
+    def version(self):
+        return self.shards.version
+
+    def predict_churn_prob(self, segment, price, discount_percent, units_sold):
+        return self.shards.shard(segment)[1].predict_churn_prob(segment, price, discount_percent, units_sold)
+
+    def predict_churn_prob_batch(self, segment, prices, discount_percents, units_sold):
+        return self.shards.route(
+            segment, lambda models, seg, p, d, u: models[1].predict_churn_prob_batch(seg, p, d, u),
+            prices, discount_percents, units_sold)
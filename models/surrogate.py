@@ -0,0 +1,118 @@
+import uuid
+from bisect import bisect_right
+import numpy as np
+
+class DemandSurrogate:
+    """
+    Tabulated per-segment demand curves distilled from the demand forest.
+    Each segment gets a price x discount grid of forest predictions (optionally made
+    monotone non-increasing in price), answered by bilinear interpolation. Queries outside the
+    tabulated range, or for unknown segments, return no answer so callers fall back
+    to the forest.
+    """
+
+    def __init__(self, price_points=128, discount_points=16, monotone=False):
+        self.price_points = price_points
+        self.discount_points = discount_points
+        self.monotone = monotone
+        self.tables = {}
+        self.fidelity = {}
+        self.version = None
+
+    def fit(self, predictor, df):
+        """
+        Tabulates predictor (a CompiledDemandPredictor) per segment.
+        The price range spans 0.5x the cheapest to 2x the dearest observed price, which
+        covers the simulator's -50% .. +100% sliders; discounts span 0 to max + 20 points.
+        """
+        self.tables = {}
+        self.fidelity = {}
+        for segment, seg_df in df.groupby('segment'):
+            segment = str(segment)
+            prices = np.linspace(seg_df['price'].min() * 0.5, seg_df['price'].max() * 2.0, self.price_points)
+            discounts = np.linspace(0, min(1.0, seg_df['discount_percent'].max() + 0.2), self.discount_points)
+            price_grid, discount_grid = np.meshgrid(prices, discounts, indexing='ij')
+            units = np.maximum(0, predictor.predict(segment, price_grid, discount_grid))
+
+            if self.monotone:
+                # Demand should not rise with price: isotonic fit along the price axis per discount level
+                from sklearn.isotonic import IsotonicRegression
+                iso = IsotonicRegression(increasing=False)
+                units = np.column_stack([iso.fit_transform(prices, units[:, j]) for j in range(len(discounts))])
+
+            self.tables[segment] = {
+                "prices": prices,
+                "discounts": discounts,
+                "units": units,
+                # Plain lists keep the single-query path free of NumPy call overhead
+                "price_list": prices.tolist(),
+                "discount_list": discounts.tolist(),
+                "unit_rows": units.tolist()
+            }
+            self.fidelity[segment] = self._fidelity(predictor, segment, prices, discounts)
+
+        self.version = uuid.uuid4().hex
+        return self
+
+    def _fidelity(self, predictor, segment, prices, discounts):
+        """Error against the forest on a held-out grid of cell midpoints."""
+        mid_prices = (prices[:-1] + prices[1:]) / 2
+        mid_discounts = (discounts[:-1] + discounts[1:]) / 2
+        price_grid, discount_grid = np.meshgrid(mid_prices, mid_discounts, indexing='ij')
+
+        exact = np.maximum(0, predictor.predict(segment, price_grid, discount_grid))
+        approx, _ = self.predict(segment, price_grid, discount_grid)
+        error = np.abs(approx - exact)
+        return {
+            "mae": float(error.mean()),
+            "max_abs_error": float(error.max()),
+            "relative_mae": float(error.mean() / exact.mean()) if exact.mean() > 0 else 0.0
+        }
+
+    def predict_one(self, segment, price, discount_percent):
+        """Units for a single query, or None if it leaves the tabulated range."""
+        table = self.tables.get(segment)
+        if table is None:
+            return None
+        prices, discounts = table["price_list"], table["discount_list"]
+        if not (prices[0] <= price <= prices[-1] and discounts[0] <= discount_percent <= discounts[-1]):
+            return None
+
+        i = min(bisect_right(prices, price) - 1, len(prices) - 2)
+        j = min(bisect_right(discounts, discount_percent) - 1, len(discounts) - 2)
+        tx = (price - prices[i]) / (prices[i + 1] - prices[i])
+        ty = (discount_percent - discounts[j]) / (discounts[j + 1] - discounts[j])
+        row0, row1 = table["unit_rows"][i], table["unit_rows"][i + 1]
+        return ((row0[j] * (1 - ty) + row0[j + 1] * ty) * (1 - tx)
+                + (row1[j] * (1 - ty) + row1[j + 1] * ty) * tx)
+
+    def predict(self, segment, prices, discount_percents):
+        """
+        Vectorized lookup. Returns (units, covered): units is NaN wherever covered is
+        False (outside the table or unknown segment).
+        """
+        prices, discount_percents = np.broadcast_arrays(
+            np.asarray(prices, dtype=float),
+            np.asarray(discount_percents, dtype=float)
+        )
+        segments = np.broadcast_to(np.asarray(segment, dtype=object), prices.shape)
+        units = np.full(prices.shape, np.nan)
+
+        for name, table in self.tables.items():
+            grid_p, grid_d = table["prices"], table["discounts"]
+            rows = ((segments == name)
+                    & (prices >= grid_p[0]) & (prices <= grid_p[-1])
+                    & (discount_percents >= grid_d[0]) & (discount_percents <= grid_d[-1]))
+            if not rows.any():
+                continue
+
+            p, d = prices[rows], discount_percents[rows]
+            i = np.clip(np.searchsorted(grid_p, p, side='right') - 1, 0, len(grid_p) - 2)
+            j = np.clip(np.searchsorted(grid_d, d, side='right') - 1, 0, len(grid_d) - 2)
+            tx = (p - grid_p[i]) / (grid_p[i + 1] - grid_p[i])
+            ty = (d - grid_d[j]) / (grid_d[j + 1] - grid_d[j])
+            grid = table["units"]
+            units[rows] = ((grid[i, j] * (1 - ty) + grid[i, j + 1] * ty) * (1 - tx)
+                           + (grid[i + 1, j] * (1 - ty) + grid[i + 1, j + 1] * ty) * tx)
+
+        return units, ~np.isnan(units)
@@ -1,3 +1,4 @@
+import io
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
@@ -7,6 +8,7 @@ def generate_pdf_report(simulation_results, filepath="strategy_report.pdf"):
     """
     Generates a PDF report based on simulation results.
     simulation_results: list of dicts (one per segment simulation)
+    filepath: a path, or a binary file-like object (e.g. io.BytesIO) to render into.
     """
     doc = SimpleDocTemplate(filepath, pagesize=letter)
     styles = getSampleStyleSheet()
@@ -77,7 +79,14 @@ def generate_pdf_report(simulation_results, filepath="strategy_report.pdf"):
     story.append(Paragraph("DISCLAIMER: This report is generated by an AI model. All strategic decisions should be reviewed by human experts.", styles['Italic']))
 
     doc.build(story)
-    print(f"Report generated at {filepath}")
+    if isinstance(filepath, str):
+        print(f"Report generated at {filepath}")
+
+def render_pdf_report(simulation_results):
+    """Renders the report in memory and returns the PDF bytes (nothing touches disk)."""
+    buffer = io.BytesIO()
+    generate_pdf_report(simulation_results, buffer)
+    return buffer.getvalue()
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,83 @@
+import uuid
+import numpy as np
+import pandas as pd
+
+SCATTER_COLUMNS = ['price', 'units_sold', 'segment']
+
+class AnalyticsAggregates:
+    """
+    Dashboard aggregates (revenue by segment, total revenue, churn rate, scatter sample)
+    maintained incrementally: update() folds in new rows without rescanning earlier ones.
+    The scatter sample is a bottom-k sample (the rows with the smallest random keys), so it
+    stays uniform as rows are appended and is only redrawn when the data changes.
+    version changes on every update and doubles as the HTTP ETag.
+    """
+
+    def __init__(self, sample_size=100, seed=None):
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.churned = 0.0
+        self.revenue_by_segment = pd.Series(dtype=float)
+        self.sample = pd.DataFrame(columns=SCATTER_COLUMNS)
+        self.sample_keys = np.empty(0)
+        self.version = None
+        self.payload = None
+
+    @classmethod
+    def from_frame(cls, df, chunk_size=1_000_000, **kwargs):
+        aggregates = cls(**kwargs)
+        for start in range(0, len(df), chunk_size):
+            aggregates.update(df.iloc[start:start + chunk_size], publish=False)
+        aggregates._publish()
+        return aggregates
+
+    def copy(self):
+        """Independent copy to update while readers keep using this one."""
+        other = AnalyticsAggregates(self.sample_size)
+        other.rng = self.rng
+        other.rows = self.rows
+        other.churned = self.churned
+        other.revenue_by_segment = self.revenue_by_segment.copy()
+        other.sample = self.sample.copy()
+        other.sample_keys = self.sample_keys.copy()
+        other.version = self.version
+        other.payload = self.payload
+        return other
+
+    def update(self, df, publish=True):
+        """Folds appended rows into the aggregates."""
+        if 'revenue' in df.columns:
+            revenue = df['revenue'].to_numpy(dtype=float)
+        else:
+            # Raw synthetic data has no engineered revenue column yet
+            revenue = (df['price'] * (1 - df['discount_percent']) * df['units_sold']).to_numpy(dtype=float)
+
+        segment_revenue = pd.Series(revenue).groupby(df['segment'].astype(str).to_numpy()).sum()
+        self.revenue_by_segment = self.revenue_by_segment.add(segment_revenue, fill_value=0)
+        self.rows += len(df)
+        self.churned += float(df['churned'].sum())
+
+        # Keep the sample_size rows with the smallest keys across everything seen so far
+        keys = np.concatenate([self.sample_keys, self.rng.random(len(df))])
+        candidates = pd.concat([self.sample, df[SCATTER_COLUMNS].astype({'segment': str})], ignore_index=True)
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, candidates = keys[keep], candidates.iloc[keep]
+        self.sample_keys, self.sample = keys, candidates.reset_index(drop=True)
+
+        if publish:
+            self._publish()
+        return self
+
+    def _publish(self):
+        # Response body is built once per version, not per request
+        self.version = uuid.uuid4().hex
+        self.payload = {
+            "version": self.version,
+            "rows": self.rows,
+            "revenue_by_segment": {str(k): float(v) for k, v in self.revenue_by_segment.items()},
+            "total_revenue": float(self.revenue_by_segment.sum()),
+            "churn_rate": self.churned / self.rows if self.rows else 0.0,
+            "scatter_data": self.sample.to_dict(orient='records')
+        }
@@ -1,89 +1,90 @@
+import os
 import pandas as pd
 import numpy as np
-import random
 from datetime import datetime, timedelta
 
-def generate_synthetic_data(num_records=1000):
+SEGMENTS = ['SMB', 'Mid', 'Enterprise']
+SEGMENT_WEIGHTS = [0.5, 0.3, 0.2]
+
+BASE_PRICES = np.array([100, 500, 2000], dtype=float)
+PRICE_VARIANCE = np.array([20, 100, 500], dtype=float)
+# Discount logic: Higher for Enterprise
+DISCOUNT_BASE = np.array([0.0, 0.05, 0.10])
+# Price Elasticity varies by segment
+ELASTICITY = np.array([-1.5, -1.0, -0.5])
+BASE_UNITS = np.array([10, 20, 50], dtype=float) # Average seats/units
+# Higher churn for SMB
+CHURN_PROB_BASE = np.array([0.10, 0.05, 0.05])
+
+def _as_generator(rng):
+    """Accepts a numpy Generator, an int seed or None (fixed seed 42, as before)."""
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(42 if rng is None else rng)
+
+def _month_labels(start_date):
+    return np.array([(start_date + timedelta(days=30 * offset)).strftime("%Y-%m") for offset in range(12)])
+
+def generate_synthetic_data(num_records=1000, rng=None, start_id=0, start_date=None):
     """
     Generates synthetic SaaS pricing data for training and simulation.
     Schema: customer_id, segment, price, units_sold, discount_percent, churned, month
+    rng may be a numpy Generator or an int seed; start_id offsets customer ids (for chunked output).
     """
-    np.random.seed(42)
-    
-    segments = ['SMB', 'Mid', 'Enterprise']
-    segment_weights = [0.5, 0.3, 0.2]
-    
-    base_prices = {'SMB': 100, 'Mid': 500, 'Enterprise': 2000}
-    price_variance = {'SMB': 20, 'Mid': 100, 'Enterprise': 500}
-    
-    data = []
-    
+    rng = _as_generator(rng)
+    start_date = start_date or datetime.now() - timedelta(days=365)
+    n = num_records
+
+    segment = rng.choice(len(SEGMENTS), size=n, p=SEGMENT_WEIGHTS)
+    base_price = BASE_PRICES[segment]
+
+    # Base price fluctuations, with a minimum price constraint
+    price = np.maximum(base_price + rng.normal(0, PRICE_VARIANCE[segment]), base_price * 0.5)
+
+    discount_percent = np.clip(rng.normal(DISCOUNT_BASE[segment], 0.05), 0, 0.3)
+
+    # Demand function: Q = A * P^b around the segment's base price
+    price_factor = (price * (1 - discount_percent)) / base_price
+    units_sold = np.trunc(BASE_UNITS[segment] * price_factor ** ELASTICITY[segment] * rng.normal(1, 0.1, n))
+    units_sold = np.maximum(1, units_sold).astype(int)
+
+    # Churn logic
+    # High price increase -> High churn probability
+    # High discount -> Low churn probability
+    prob_churn = np.clip(CHURN_PROB_BASE[segment] + 0.1 * (price_factor - 1) - 0.1 * discount_percent, 0, 1)
+    churned = (rng.random(n) < prob_churn).astype(int)
+
+    # Random month within last year
+    month = _month_labels(start_date)[rng.integers(0, 12, n)]
+
+    ids = np.arange(start_id + 1, start_id + n + 1)
+    return pd.DataFrame({
+        "customer_id": pd.Series(ids).astype(str).str.zfill(4).radd("CUST_"),
+        "segment": np.array(SEGMENTS)[segment],
+        "price": np.round(price, 2),
+        "units_sold": units_sold,
+        "discount_percent": np.round(discount_percent, 2),
+        "churned": churned,
+        "month": month
+    })
+
+def iter_synthetic_data(num_records, chunk_size=1_000_000, rng=None):
+    """Yields generate_synthetic_data frames of at most chunk_size rows, with continuous customer ids."""
+    rng = _as_generator(rng)
     start_date = datetime.now() - timedelta(days=365)
-    
-    for i in range(num_records):
-        customer_id = f"CUST_{i+1:04d}"
-        segment = np.random.choice(segments, p=segment_weights)
-        
-        # Base price fluctuations
-        price = base_prices[segment] + np.random.normal(0, price_variance[segment])
-        price = max(price, base_prices[segment] * 0.5) # Minimum price constraint
-        
-        # Discount logic: Higher for Enterprise, higher if price is high
-        discount_base = 0.0
-        if segment == 'Enterprise':
-            discount_base = 0.10
-        elif segment == 'Mid':
-            discount_base = 0.05
-            
-        discount_percent = max(0, min(0.3, np.random.normal(discount_base, 0.05)))
-        
-        # Units sold (Demand) - Negative correlation with price (Price Elasticity)
-        # Elasticity varies by segment
-        elasticity = {'SMB': -1.5, 'Mid': -1.0, 'Enterprise': -0.5}
-        
-        base_units = {'SMB': 10, 'Mid': 20, 'Enterprise': 50} # Average seats/units
-        
-        # Demand function: log(Q) = a + b * log(P) + noise -> Q = A * P^b
-        # Simplified: Linear approximation around base
-        
-        price_factor = (price * (1 - discount_percent)) / base_prices[segment]
-        units_sold = int(base_units[segment] * (price_factor ** elasticity[segment]) * np.random.normal(1, 0.1))
-        units_sold = max(1, units_sold)
-        
-        # Churn logic
-        # High price increase -> High churn probability
-        # High discount -> Low churn probability
-        # Segment sensitivity
-        churn_prob_base = 0.05
-        if segment == 'SMB':
-            churn_prob_base += 0.05 # Higher churn for SMB
-            
-        prob_churn = churn_prob_base + (0.1 * (price_factor - 1)) - (0.1 * discount_percent)
-        prob_churn = max(0, min(1, prob_churn))
-        
-        churned = 1 if np.random.rand() < prob_churn else 0
-        
-        # Random month within last year
-        month_offset = np.random.randint(0, 12)
-        month_date = start_date + timedelta(days=30*month_offset)
-        month_str = month_date.strftime("%Y-%m")
-        
-        data.append({
-            "customer_id": customer_id,
-            "segment": segment,
-            "price": round(price, 2),
-            "units_sold": units_sold,
-            "discount_percent": round(discount_percent, 2),
-            "churned": churned,
-            "month": month_str
-        })
-        
-    df = pd.DataFrame(data)
-    return df
+    for start in range(0, num_records, chunk_size):
+        yield generate_synthetic_data(min(chunk_size, num_records - start), rng=rng,
+                                      start_id=start, start_date=start_date)
+
+def write_synthetic_data(path, num_records, chunk_size=1_000_000, rng=None):
+    """Streams a synthetic dataset of any size to a CSV file, one chunk in memory at a time."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as f:
+        for i, chunk in enumerate(iter_synthetic_data(num_records, chunk_size, rng)):
+            chunk.to_csv(f, index=False, header=i == 0)
+    return path
 
 if __name__ == "__main__":
-    df = generate_synthetic_data(2000)
-    output_path = "C:/Users/PC/.gemini/antigravity/scratch/pricing-ai-consultant/data/raw/synthetic_saas_data.csv"
-    df.to_csv(output_path, index=False)
+    output_path = write_synthetic_data("data/raw/synthetic_saas_data.csv", 2000)
     print(f"Synthetic data generated at {output_path}")
-    print(df.head())
+    print(pd.read_csv(output_path).head())
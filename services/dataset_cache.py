@@ -0,0 +1,107 @@
+import os
+import json
+import shutil
+import hashlib
+import uuid
+import numpy as np
+import pandas as pd
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+class DatasetCache:
+    """
+    Content-addressed store of processed (cleaned, engineered, segmented) frames.
+    Each entry is a directory of per-column .npy files plus meta.json, keyed by the
+    hash of the upload. Numeric columns are memory-mapped on read, so reopening a
+    dataset skips parsing and re-segmentation and costs almost no RAM up front.
+    """
+
+    META_FILE = "meta.json"
+
+    def __init__(self, root="data/cache"):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._path(key), self.META_FILE))
+
+    def keys(self):
+        return [name for name in os.listdir(self.root) if not name.startswith(".") and name in self]
+
+    def last_used(self, key):
+        """When key was last stored or read (epoch seconds)."""
+        return os.path.getmtime(self._path(key))
+
+    def _touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def put(self, key, df):
+        """Stores df under key (no-op if already cached)."""
+        if key in self:
+            self._touch(key)
+            return
+        staging = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}.tmp")
+        os.makedirs(staging)
+        try:
+            columns = []
+            for i, (name, series) in enumerate(df.items()):
+                entry = {"name": name, "file": f"{i}.npy"}
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    entry["kind"] = "category"
+                    entry["categories"] = series.cat.categories.tolist()
+                    values = series.cat.codes.to_numpy()
+                elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+                    entry["kind"] = "numeric"
+                    values = series.to_numpy()
+                else:
+                    # Fixed-width unicode keeps text columns in plain .npy files too
+                    entry["kind"] = "text"
+                    values = series.astype(str).to_numpy(dtype=str)
+                np.save(os.path.join(staging, entry["file"]), values, allow_pickle=False)
+                columns.append(entry)
+
+            with open(os.path.join(staging, self.META_FILE), "w") as f:
+                json.dump({"rows": len(df), "columns": columns}, f)
+            os.rename(staging, self._path(key))
+        except OSError:
+            # Another writer may have stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+            if key not in self:
+                raise
+
+    def get(self, key):
+        """The cached frame for key, or None. Numeric columns are read-only memory maps."""
+        if key not in self:
+            return None
+        path = self._path(key)
+        self._touch(key)
+        with open(os.path.join(path, self.META_FILE)) as f:
+            meta = json.load(f)
+
+        data = {}
+        for entry in meta["columns"]:
+            filepath = os.path.join(path, entry["file"])
+            if entry["kind"] == "numeric":
+                data[entry["name"]] = np.load(filepath, mmap_mode="r")
+            elif entry["kind"] == "category":
+                codes = np.load(filepath, mmap_mode="r")
+                data[entry["name"]] = pd.Categorical.from_codes(codes, entry["categories"])
+            else:
+                data[entry["name"]] = pd.array(np.load(filepath), dtype="str")
+        return pd.DataFrame(data, copy=False)
+
+    def remove(self, key):
+        """Deletes an entry. Frames already read from it stay usable: their memory maps outlive the files."""
+        trash = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}.trash")
+        try:
+            os.rename(self._path(key), trash)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
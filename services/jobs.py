@@ -0,0 +1,79 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+class JobManager:
+    """
+    Runs multi-stage jobs (e.g. parse -> segment -> train) on a worker pool so request
+    handlers can return immediately, and keeps per-stage status for polling.
+    Each stage is a (name, fn) pair; fn receives a context dict shared by all stages.
+    """
+
+    def __init__(self, max_workers=1, max_history=100):
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name, stages, context=None):
+        """Queues a job and returns its id."""
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "name": name,
+            "status": "queued",
+            "progress": 0.0,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "finished_at": None,
+            "stages": [{"name": stage_name, "status": "pending", "seconds": None} for stage_name, _ in stages],
+            "result": None,
+            "error": None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+
+        self._executor.submit(self._run, job, stages, context if context is not None else {})
+        return job_id
+
+    def get(self, job_id):
+        """Snapshot of a job's status, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "stages": [dict(stage) for stage in job["stages"]]}
+
+    def _run(self, job, stages, context):
+        self._update(job, status="running")
+        for i, (_, fn) in enumerate(stages):
+            stage = job["stages"][i]
+            self._update(stage, status="running")
+            start = time.perf_counter()
+            try:
+                fn(context)
+            except Exception as e:
+                self._update(stage, status="failed", seconds=time.perf_counter() - start)
+                self._update(job, status="failed", error=str(e),
+                             finished_at=datetime.utcnow().isoformat() + "Z")
+                return
+            self._update(stage, status="done", seconds=time.perf_counter() - start)
+            self._update(job, progress=(i + 1) / len(stages))
+
+        self._update(job, status="succeeded", result=context.get("result"),
+                     finished_at=datetime.utcnow().isoformat() + "Z")
+
+    def _update(self, record, **fields):
+        with self._lock:
+            record.update(fields)
+
+    def _trim(self):
+        # Forget the oldest finished jobs once history is full
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_history:
+                break
+            if self._jobs[job_id]["status"] in ("succeeded", "failed"):
+                del self._jobs[job_id]
@@ -0,0 +1,226 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits (~10us) to training runs
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10_000, 100_000, 1_000_000)
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base for labelled metrics; one value slot per distinct label combination."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def replace_all(self, samples):
+        """Swaps in a fresh set of (labels dict, value) samples, e.g. at scrape time."""
+        values = {self._key(labels): value for labels, value in samples}
+        with self._lock:
+            self._values = values
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; observe() is a bisect and three additions under a lock."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Holds metrics and renders them in the Prometheus text exposition format.
+    Collectors are callables run at scrape time to refresh gauges that are cheaper to
+    read on demand (cache stats, dataset sizes) than to keep updated on every request.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route, until the response body is sent.",
+    ("method", "route", "status")))
+INFERENCE_SECONDS = REGISTRY.register(Histogram(
+    "model_inference_seconds", "Model inference time per call.", ("model", "kind")))
+INFERENCE_BATCH_SIZE = REGISTRY.register(Histogram(
+    "model_inference_batch_size", "Rows per model inference call.", ("model", "kind"), buckets=SIZE_BUCKETS))
+TRAINING_SECONDS = REGISTRY.register(Histogram(
+    "model_training_seconds", "Wall-clock training time per model.", ("model",)))
+ROWS_INGESTED = REGISTRY.register(Counter(
+    "dataset_rows_ingested_total", "Rows ingested into workspace datasets.", ("source",)))
+# Refreshed at scrape time from the resident workspaces
+SIMULATOR_CACHE_HITS = REGISTRY.register(Gauge(
+    "simulator_cache_hits", "Simulator cache hits since the serving models were published.", ("workspace", "cache")))
+SIMULATOR_CACHE_MISSES = REGISTRY.register(Gauge(
+    "simulator_cache_misses", "Simulator cache misses since the serving models were published.", ("workspace", "cache")))
+SIMULATOR_CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "simulator_cache_hit_ratio", "Simulator cache hit rate.", ("workspace", "cache")))
+DATASET_ROWS = REGISTRY.register(Gauge(
+    "dataset_rows", "Rows in the in-memory serving dataset.", ("workspace",)))
+DATASET_MEMORY_BYTES = REGISTRY.register(Gauge(
+    "dataset_memory_bytes", "Memory used by the in-memory serving dataset.", ("workspace",)))
+WORKSPACE_MEMORY_BYTES = REGISTRY.register(Gauge(
+    "workspace_memory_bytes", "Memory used by a resident workspace (dataset and models).", ("workspace",)))
+
+@contextmanager
+def time_inference(model, kind, batch_size):
+    """Records one model call: its duration and how many rows it scored."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        INFERENCE_SECONDS.observe(time.perf_counter() - start, model=model, kind=kind)
+        INFERENCE_BATCH_SIZE.observe(batch_size, model=model, kind=kind)
+
+def workspace_collector(manager):
+    """Scrape-time collector for the cache and dataset gauges of a WorkspaceManager's resident workspaces."""
+    def collect():
+        hits, misses, ratios, rows, dataset_bytes, memory_bytes = [], [], [], [], [], []
+        for workspace in manager.resident():
+            snapshot = workspace.snapshot
+            if snapshot is None:
+                continue
+            labels = {"workspace": workspace.name}
+            for cache, stats in snapshot.simulator.cache_stats().items():
+                cache_labels = {**labels, "cache": cache}
+                hits.append((cache_labels, stats["hits"]))
+                misses.append((cache_labels, stats["misses"]))
+                ratios.append((cache_labels, stats["hit_rate"]))
+            rows.append((labels, len(snapshot.df) if snapshot.df is not None else 0))
+            dataset_bytes.append((labels, workspace.dataset_bytes))
+            memory_bytes.append((labels, workspace.memory_bytes))
+        SIMULATOR_CACHE_HITS.replace_all(hits)
+        SIMULATOR_CACHE_MISSES.replace_all(misses)
+        SIMULATOR_CACHE_HIT_RATIO.replace_all(ratios)
+        DATASET_ROWS.replace_all(rows)
+        DATASET_MEMORY_BYTES.replace_all(dataset_bytes)
+        WORKSPACE_MEMORY_BYTES.replace_all(memory_bytes)
+    return collect
+
+class RequestMetricsMiddleware:
+    """
+    Plain ASGI middleware recording REQUEST_LATENCY per route template (e.g. /jobs/{job_id}),
+    so label cardinality stays bounded. Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(time.perf_counter() - start, method=scope["method"],
+                                    route=getattr(route, "path", "unmatched"), status=status[0])
@@ -0,0 +1,81 @@
+import pandas as pd
+import numpy as np
+from services.metrics import time_inference
+
+AGGREGATES = ['rows', 'baseline_revenue', 'predicted_revenue', 'expected_churners', 'revenue_at_risk']
+
+def iter_chunks(data, chunk_size):
+    """Yields DataFrame chunks from a DataFrame or an iterable of DataFrames (e.g. read_csv(chunksize=...))."""
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunk_size):
+            yield data.iloc[start:start + chunk_size]
+    else:
+        yield from data
+
+def simulate_chunk(chunk, revenue_model, churn_model, policy, policy_column='segment', discount_change_pct=0.0):
+    """
+    Applies the pricing policy to every row of one chunk and aggregates the outcome per policy group.
+    policy: dict mapping values of policy_column to a % price change (missing groups keep their price).
+    """
+    segments = chunk['segment'].to_numpy(dtype=object)
+    prices = chunk['price'].to_numpy(dtype=float)
+    discounts = chunk['discount_percent'].to_numpy(dtype=float)
+
+    price_change = chunk[policy_column].map(policy).fillna(0).to_numpy(dtype=float)
+    new_prices = prices * (1 + price_change / 100.0)
+    new_discounts = np.clip(discounts + discount_change_pct / 100.0, 0, 1)
+
+    # Baseline and policy rows go through the demand model together
+    n = len(chunk)
+    with time_inference("revenue", "portfolio", 2 * n):
+        units, revenue = revenue_model.predict_demand_batch(
+            np.concatenate([segments, segments]),
+            np.concatenate([prices, new_prices]),
+            np.concatenate([discounts, new_discounts])
+        )
+    with time_inference("churn", "portfolio", n):
+        churn = churn_model.predict_churn_prob_batch(segments, new_prices, new_discounts, units[n:])
+
+    return pd.DataFrame({
+        'group': chunk[policy_column].to_numpy(),
+        'rows': 1,
+        'baseline_revenue': revenue[:n],
+        'predicted_revenue': revenue[n:],
+        'expected_churners': churn,
+        'revenue_at_risk': churn * revenue[n:]
+    }).groupby('group')[AGGREGATES].sum()
+
+def simulate_portfolio(data, revenue_model, churn_model, policy, policy_column='segment',
+                       discount_change_pct=0.0, chunk_size=100_000, n_jobs=1):
+    """
+    Rolls a pricing policy out across every customer row instead of a segment average.
+    data can be a DataFrame or an iterable of DataFrame chunks, so large files can be
+    streamed without holding all intermediate frames in memory.
+    n_jobs > 1 evaluates chunks on a thread pool (tree and linear inference release the GIL).
+    Returns portfolio totals plus a per-group breakdown.
+    """
+    from joblib import Parallel, delayed
+    tasks = (delayed(simulate_chunk)(chunk, revenue_model, churn_model, policy, policy_column, discount_change_pct)
+             for chunk in iter_chunks(data, chunk_size))
+
+    totals = None
+    for partial in Parallel(n_jobs=n_jobs, prefer='threads', return_as='generator_unordered')(tasks):
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+
+    if totals is None:
+        totals = pd.DataFrame(columns=AGGREGATES, dtype=float)
+
+    def summarize(values):
+        baseline = values['baseline_revenue']
+        return {
+            'rows': int(values['rows']),
+            'baseline_revenue': float(baseline),
+            'predicted_revenue': float(values['predicted_revenue']),
+            'revenue_uplift_pct': float((values['predicted_revenue'] - baseline) / baseline * 100) if baseline > 0 else 0.0,
+            'expected_churners': float(values['expected_churners']),
+            'revenue_at_risk': float(values['revenue_at_risk'])
+        }
+
+    result = summarize(totals.sum())
+    result['by_group'] = {str(group): summarize(values) for group, values in totals.iterrows()}
+    return result
@@ -1,5 +1,30 @@
 import pandas as pd
 import numpy as np
+import sys
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Explicit dtypes for streaming ingestion. Integer columns are parsed as float32
+# (fast C parsing, NaN-capable) and narrowed to CLEAN_DTYPES once clean_data drops gaps.
+INGEST_SCHEMA = {
+    'segment': 'category',
+    'price': 'float32',
+    'discount_percent': 'float32',
+    'units_sold': 'float32',
+    'churned': 'float32'
+}
+CLEAN_DTYPES = {'units_sold': 'int32', 'churned': 'int8'}
+# Columns the models train on; uploads without them are rejected up front
+REQUIRED_COLUMNS = ['segment', 'price', 'discount_percent', 'units_sold', 'churned']
+
+def missing_columns(columns):
+    """Required columns absent from a header, in schema order."""
+    columns = set(columns)
+    return [col for col in REQUIRED_COLUMNS if col not in columns]
 
 def load_data(filepath):
     """Loads data from CSV."""
@@ -27,9 +52,81 @@ def feature_engineering(df):
     
     return df
 
-def preprocess_pipeline(filepath):
-    """Full preprocessing pipeline."""
+def preprocess_pipeline(filepath, chunksize=None):
+    """Full preprocessing pipeline. Pass chunksize to stream large files with a typed schema."""
+    if chunksize:
+        df, _ = preprocess_pipeline_streaming(filepath, chunksize)
+        return df
     df = load_data(filepath)
     df = clean_data(df)
     df = feature_engineering(df)
     return df
+
+def _max_rss_bytes():
+    """High-water mark of this process's resident memory, or None if unavailable."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in KB elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def preprocess_pipeline_streaming(filepath, chunksize=250_000, measure_memory=False):
+    """
+    Streaming version of preprocess_pipeline for large exports.
+    Reads with INGEST_SCHEMA in chunks and cleans / engineers each chunk before the next
+    is read, so only one raw chunk is in flight. Returns (df, stats) where stats has
+    rows, chunks, seconds, rows_per_second, frame_memory_mb and peak_memory_mb.
+    By default peak_memory_mb is how much the process's peak RSS grew during the ingest
+    (free to read, but 0 if an earlier peak was higher; None where getrusage is missing).
+    measure_memory=True uses tracemalloc for the exact peak of Python allocations instead:
+    it is process-wide and slows every thread while it runs, so keep it off in serving.
+    """
+    header = pd.read_csv(filepath, nrows=0).columns
+    missing = missing_columns(header)
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    dtypes = {col: dtype for col, dtype in INGEST_SCHEMA.items() if col in header}
+
+    already_tracing = tracemalloc.is_tracing()
+    if measure_memory:
+        if already_tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+    start_maxrss = _max_rss_bytes()
+    start = time.perf_counter()
+
+    chunks = []
+    n_chunks = 0
+    for chunk in pd.read_csv(filepath, dtype=dtypes, chunksize=chunksize):
+        n_chunks += 1
+        chunk = clean_data(chunk)
+        chunk = chunk.astype({col: dtype for col, dtype in CLEAN_DTYPES.items() if col in chunk.columns})
+        chunks.append(feature_engineering(chunk))
+
+    # Chunks see different category sets; align them so concat keeps the categorical dtype
+    if chunks and 'segment' in dtypes:
+        categories = pd.api.types.union_categoricals([c['segment'] for c in chunks]).categories
+        for chunk in chunks:
+            chunk['segment'] = chunk['segment'].cat.set_categories(categories)
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=header)
+    del chunks
+
+    seconds = time.perf_counter() - start
+    peak = None
+    if measure_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+    elif start_maxrss is not None:
+        peak = _max_rss_bytes() - start_maxrss
+
+    stats = {
+        "rows": len(df),
+        "chunks": n_chunks,
+        "seconds": seconds,
+        "rows_per_second": len(df) / seconds if seconds > 0 else 0.0,
+        "peak_memory_mb": peak / 1e6 if peak is not None else None,
+        "frame_memory_mb": float(df.memory_usage(deep=True).sum()) / 1e6
+    }
+    return df, stats
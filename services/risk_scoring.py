@@ -1,3 +1,5 @@
+import numpy as np
+
 def calculate_risk_score(revenue_uplift_pct, churn_probability):
     """
     Calculates a risk score (0-100) and label.
@@ -32,3 +34,22 @@ def calculate_risk_score(revenue_uplift_pct, churn_probability):
         label = "Critical Risk"
         
     return round(score, 1), label
+
+def calculate_risk_scores(revenue_uplift_pct, churn_probability):
+    """
+    Vectorized version of calculate_risk_score for arrays of scenarios.
+    Returns (scores, labels) as NumPy arrays.
+    """
+    revenue_uplift_pct = np.asarray(revenue_uplift_pct, dtype=float)
+    churn_probability = np.asarray(churn_probability, dtype=float)
+
+    score = (churn_probability * 100) * 0.7 - (revenue_uplift_pct * 0.2)
+    score = np.clip(score, 0, 100)
+
+    labels = np.select(
+        [score < 20, score < 50, score < 80],
+        ["Safe / Low Risk", "Moderate Risk", "High Risk"],
+        default="Critical Risk"
+    )
+
+    return np.round(score, 1), labels
@@ -1,39 +1,159 @@
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+import os
+import time
+import uuid
+import numpy as np
 import pandas as pd
 
-def perform_segmentation(df, n_clusters=3):
+FEATURES = ['price', 'units_sold', 'discount_percent', 'revenue']
+VALUE_LABELS = ['Low Value', 'Mid Value', 'High Value', 'Premium'] # Generic list
+# Candidate cluster counts for n_clusters="auto"
+AUTO_K_RANGE = range(2, 9)
+
+def value_labels(n_clusters):
+    """Names for n_clusters value-ranked clusters, lowest value first."""
+    if n_clusters == 2:
+        return ['Low Value', 'High Value']
+    if n_clusters <= len(VALUE_LABELS):
+        return VALUE_LABELS[:n_clusters]
+    return ['Low Value'] + [f"Value Tier {i}" for i in range(2, n_clusters)] + ['Premium']
+
+def _score_k(X_sample, k, score_size, random_state):
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
+    labels = KMeans(n_clusters=k, n_init=1, random_state=random_state).fit_predict(X_sample)
+    # Silhouette is quadratic in rows, so it is scored on a smaller subsample
+    return k, float(silhouette_score(X_sample, labels, sample_size=min(score_size, len(X_sample)),
+                                     random_state=random_state))
+
+def select_n_clusters(X_scaled, k_values=AUTO_K_RANGE, sample_size=10_000, score_size=2_000,
+                      n_jobs=-1, random_state=42):
+    """
+    Picks the cluster count with the best silhouette score.
+    Every candidate is fitted on the same random sample of at most sample_size rows and
+    scored on score_size of them, so the cost does not grow with the dataset; candidates
+    are evaluated in parallel. Returns {"k", "scores" (k -> silhouette), "sample_size", "seconds"}.
+    """
+    from joblib import Parallel, delayed
+    start = time.perf_counter()
+    rng = np.random.default_rng(random_state)
+    if len(X_scaled) > sample_size:
+        X_scaled = X_scaled[rng.choice(len(X_scaled), sample_size, replace=False)]
+    k_values = [k for k in k_values if 2 <= k < len(X_scaled)]
+    if not k_values:
+        raise ValueError("Not enough rows to choose a cluster count")
+
+    results = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_score_k)(X_scaled, k, score_size, random_state) for k in k_values)
+    scores = dict(results)
+    return {
+        "k": max(scores, key=scores.get),
+        "scores": scores,
+        "sample_size": len(X_scaled),
+        "seconds": time.perf_counter() - start
+    }
+
+class SegmentationModel:
+    """
+    Fitted scaler + centroids for value segmentation.
+    algorithm="minibatch" fits MiniBatchKMeans on max_steps sampled batches, so its cost
+    is bounded regardless of upload size; "kmeans" is the original full KMeans.
+    Clusters are renumbered by centroid revenue, so cluster_label 0 is always the
+    lowest-value segment and the Low/Mid/High Value names stay stable across runs.
+    assign() labels new rows without refitting.
+    n_clusters="auto" chooses the count with select_n_clusters; the outcome is kept in selection.
+    n_jobs is the core budget for that search (-1 = all cores).
+    """
+
+    def __init__(self, n_clusters=3, algorithm="kmeans", batch_size=4096, max_steps=100, random_state=42,
+                 n_jobs=-1):
+        self.n_clusters = n_clusters
+        self.algorithm = algorithm
+        self.batch_size = batch_size
+        self.max_steps = max_steps
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.selection = None
+        self.scaler = None
+        self.kmeans = None
+        self.rank = None
+
+    def fit(self, df):
+        # sklearn is imported on first use, so importing the API stays fast
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+        from sklearn.preprocessing import StandardScaler
+        X = df[FEATURES].to_numpy(dtype=float)
+        self.scaler = StandardScaler()
+        X_scaled = self.scaler.fit_transform(X)
+
+        if self.n_clusters == "auto":
+            self.selection = select_n_clusters(X_scaled, n_jobs=self.n_jobs, random_state=self.random_state)
+            self.n_clusters = self.selection["k"]
+
+        if self.algorithm == "minibatch":
+            # Feed uniformly sampled mini-batches ourselves: MiniBatchKMeans.fit draws each batch
+            # with an O(n_samples) weighted choice, which dominates on large uploads
+            rng = np.random.default_rng(self.random_state)
+            self.kmeans = MiniBatchKMeans(n_clusters=self.n_clusters, batch_size=self.batch_size,
+                                          n_init=1, random_state=self.random_state)
+            self.kmeans.partial_fit(X_scaled[rng.integers(0, len(X_scaled), 3 * self.batch_size)])
+            for _ in range(self.max_steps):
+                self.kmeans.partial_fit(X_scaled[rng.integers(0, len(X_scaled), self.batch_size)])
+        else:
+            self.kmeans = KMeans(n_clusters=self.n_clusters, random_state=self.random_state)
+            self.kmeans.fit(X_scaled)
+
+        # Rank clusters by the revenue of their centroid (in original units)
+        centroid_revenue = self.scaler.inverse_transform(self.kmeans.cluster_centers_)[:, FEATURES.index('revenue')]
+        self.rank = np.empty(self.n_clusters, dtype=int)
+        self.rank[np.argsort(centroid_revenue, kind="stable")] = np.arange(self.n_clusters)
+        return self
+
+    @property
+    def labels(self):
+        return value_labels(self.n_clusters)
+
+    def predict(self, df):
+        """Value-ranked cluster ids for the rows of df (vectorized nearest-centroid pass)."""
+        X_scaled = self.scaler.transform(df[FEATURES].to_numpy(dtype=float))
+        return self.rank[self.kmeans.predict(X_scaled)]
+
+    def assign(self, df):
+        """Adds cluster_label and segment_cluster to df using the fitted centroids."""
+        clusters = self.predict(df)
+        df['cluster_label'] = clusters
+        df['segment_cluster'] = pd.Categorical.from_codes(clusters, self.labels)
+        return df
+
+    def save(self, path):
+        # Written next to the target and renamed, so readers never load a partial file
+        import joblib
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        joblib.dump({"n_clusters": self.n_clusters, "algorithm": self.algorithm,
+                     "scaler": self.scaler, "kmeans": self.kmeans, "rank": self.rank,
+                     "selection": self.selection}, tmp_path)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        import joblib
+        state = joblib.load(path)
+        self.n_clusters = state["n_clusters"]
+        self.algorithm = state["algorithm"]
+        self.scaler = state["scaler"]
+        self.kmeans = state["kmeans"]
+        self.rank = state["rank"]
+        self.selection = state.get("selection")
+        return self
+
+def perform_segmentation(df, n_clusters=3, algorithm="kmeans", model=None):
     """
     Performs clustering to identify pricing segments.
     Uses 'price', 'units_sold', 'discount_percent', 'revenue' as features.
+    n_clusters="auto" picks the cluster count from sampled silhouette scores.
+    Pass a fitted SegmentationModel as model to assign rows to its existing clusters
+    instead of refitting. Returns (df, kmeans, scaler).
     """
-    features = ['price', 'units_sold', 'discount_percent', 'revenue']
-    X = df[features]
-    
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    clusters = kmeans.fit_predict(X_scaled)
-    
-    df['cluster_label'] = clusters
-    
-    # Assign human-readable names if possible, or just return the df with clusters
-    # We can perform analysis to map 0,1,2 to Low/Mid/High value if needed
-    # For now, we keep the cluster IDs or map them based on average revenue
-    
-    cluster_summary = df.groupby('cluster_label')['revenue'].mean().sort_values()
-    
-    # Map clusters to descriptive names based on revenue
-    cluster_map = {}
-    labels = ['Low Value', 'Mid Value', 'High Value', 'Premium'] # Generic list
-    
-    for i, (cluster_id, _) in enumerate(cluster_summary.items()):
-        if i < len(labels):
-            cluster_map[cluster_id] = labels[i]
-        else:
-            cluster_map[cluster_id] = f"Segment {i+1}"
-            
-    df['segment_cluster'] = df['cluster_label'].map(cluster_map)
-    
-    return df, kmeans, scaler
+    if model is None:
+        model = SegmentationModel(n_clusters=n_clusters, algorithm=algorithm).fit(df)
+    df = model.assign(df)
+    return df, model.kmeans, model.scaler
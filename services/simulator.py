@@ -1,12 +1,88 @@
 import pandas as pd
 import numpy as np
-from services.risk_scoring import calculate_risk_score
+import threading
+from collections import OrderedDict
+from itertools import islice
+from services.risk_scoring import calculate_risk_score, calculate_risk_scores
+from services.metrics import time_inference
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value or None, updating recency and counters."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize
+            }
 
 class PricingSimulator:
-    def __init__(self, revenue_model, churn_model):
+    def __init__(self, revenue_model, churn_model, cache_size=1024, mode="exact"):
         self.revenue_model = revenue_model
         self.churn_model = churn_model
-        
+        # "exact" queries the forest, "fast" the distilled surrogate (see RevenueModel.fit_surrogate)
+        self.mode = mode
+        # Keys include the model fingerprint, so retraining invalidates entries automatically
+        self.baseline_cache = LRUCache(maxsize=256)
+        self.scenario_cache = LRUCache(maxsize=cache_size)
+
+    def model_fingerprint(self):
+        """Identifies the currently trained model pair and how demand is evaluated."""
+        surrogate = self.revenue_model.surrogate if self.mode == "fast" else None
+        return (self.revenue_model.version, self.churn_model.version,
+                self.mode, surrogate.version if surrogate is not None else None)
+
+    def cache_stats(self):
+        return {
+            "baseline": self.baseline_cache.stats(),
+            "scenario": self.scenario_cache.stats()
+        }
+
+    def _baseline(self, segment, current_price, current_discount):
+        """Returns cached (units, revenue, churn) at the current price and discount."""
+        key = (self.model_fingerprint(), segment, current_price, current_discount)
+        baseline = self.baseline_cache.get(key)
+        if baseline is None:
+            with time_inference("revenue", "single", 1):
+                base_units, base_revenue = self.revenue_model.predict_demand(segment, current_price, current_discount, mode=self.mode)
+            with time_inference("churn", "single", 1):
+                base_churn = self.churn_model.predict_churn_prob(segment, current_price, current_discount, base_units)
+            baseline = (base_units, base_revenue, base_churn)
+            self.baseline_cache.put(key, baseline)
+        return baseline
+
     def simulate_scenario(self, current_data_summary, price_change_percent, discount_change_percent=0.0):
         """
         Simulates the impact of a price change on revenue and churn for a given segment summary.
@@ -15,19 +91,25 @@ class PricingSimulator:
         segment = current_data_summary['segment']
         current_price = current_data_summary['avg_price']
         current_discount = current_data_summary['avg_discount']
-        current_units = current_data_summary['avg_units']
+
+        key = (self.model_fingerprint(), segment, current_price, current_discount,
+               price_change_percent, discount_change_percent)
+        cached = self.scenario_cache.get(key)
+        if cached is not None:
+            return dict(cached)
         
         # New Parameters
         new_price = current_price * (1 + price_change_percent / 100.0)
         new_discount = max(0, min(1, current_discount + (discount_change_percent / 100.0)))
         
         # Predict Outcome
-        pred_units, pred_revenue = self.revenue_model.predict_demand(segment, new_price, new_discount)
-        churn_prob = self.churn_model.predict_churn_prob(segment, new_price, new_discount, pred_units)
+        with time_inference("revenue", "single", 1):
+            pred_units, pred_revenue = self.revenue_model.predict_demand(segment, new_price, new_discount, mode=self.mode)
+        with time_inference("churn", "single", 1):
+            churn_prob = self.churn_model.predict_churn_prob(segment, new_price, new_discount, pred_units)
         
         # Baseline (Approximate using the model on current params to compare apples-to-apples)
-        base_units, base_revenue = self.revenue_model.predict_demand(segment, current_price, current_discount)
-        base_churn = self.churn_model.predict_churn_prob(segment, current_price, current_discount, base_units)
+        base_units, base_revenue, base_churn = self._baseline(segment, current_price, current_discount)
         
         # Impact
         revenue_uplift_abs = pred_revenue - base_revenue
@@ -43,7 +125,7 @@ class PricingSimulator:
         safe_churn = max(0.01, churn_prob)
         cltv = (new_price * (1 - new_discount)) / safe_churn
         
-        return {
+        result = {
             "segment": segment,
             "old_price": current_price,
             "new_price": new_price,
@@ -55,22 +137,285 @@ class PricingSimulator:
             "predicted_units": pred_units,
             "cltv": cltv
         }
+        self.scenario_cache.put(key, result)
+        return dict(result)
 
-    def find_optimal_price(self, current_data_summary, max_increase=50, max_decrease=50):
+    def simulate_scenarios(self, current_data_summary, price_changes, discount_changes=0.0):
         """
-        Loops through price percentages to find the 'Golden Ratio' for revenue.
+        Simulates a whole grid of price/discount changes for one segment summary.
+        price_changes and discount_changes (in %) are broadcast against each other.
+        The baseline is predicted once per call and every scenario goes through
+        each model in a single batched pass.
+        Returns a DataFrame with one row per scenario and the simulate_scenario fields.
         """
-        best_scenario = None
-        best_revenue_uplift = -float('inf')
-        
-        # Check every 5% increment
-        for change in range(-max_decrease, max_increase + 5, 5):
-            scenario = self.simulate_scenario(current_data_summary, change)
-            # We want max revenue, but maybe we penalize high risk? 
-            # For this 'Magic Button', let's purely optimize Revenue, but return the risk too.
-            if scenario['revenue_uplift_pct'] > best_revenue_uplift:
-                best_revenue_uplift = scenario['revenue_uplift_pct']
-                best_scenario = scenario
-                best_scenario['optimal_price_change'] = change
-                
+        segment = current_data_summary['segment']
+        current_price = current_data_summary['avg_price']
+        current_discount = current_data_summary['avg_discount']
+
+        price_changes, discount_changes = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(price_changes, dtype=float)),
+            np.asarray(discount_changes, dtype=float)
+        )
+        price_changes = price_changes.ravel()
+        discount_changes = discount_changes.ravel()
+
+        # New Parameters
+        new_prices = current_price * (1 + price_changes / 100.0)
+        new_discounts = np.clip(current_discount + (discount_changes / 100.0), 0, 1)
+
+        # On a baseline cache miss it rides along as the last row, so each model still runs once
+        key = (self.model_fingerprint(), segment, current_price, current_discount)
+        baseline = self.baseline_cache.get(key)
+        prices, discounts = new_prices, new_discounts
+        if baseline is None:
+            prices = np.append(new_prices, current_price)
+            discounts = np.append(new_discounts, current_discount)
+
+        with time_inference("revenue", "batch", len(prices)):
+            units, revenue = self.revenue_model.predict_demand_batch(segment, prices, discounts, mode=self.mode)
+        with time_inference("churn", "batch", len(prices)):
+            churn = self.churn_model.predict_churn_prob_batch(segment, prices, discounts, units)
+
+        if baseline is None:
+            baseline = (units[-1], revenue[-1], churn[-1])
+            self.baseline_cache.put(key, baseline)
+            units, revenue, churn = units[:-1], revenue[:-1], churn[:-1]
+
+        pred_units, pred_revenue, churn_prob = units, revenue, churn
+        _, base_revenue, base_churn = baseline
+
+        # Impact
+        if base_revenue > 0:
+            revenue_uplift_pct = (pred_revenue - base_revenue) / base_revenue * 100
+        else:
+            revenue_uplift_pct = np.zeros_like(pred_revenue)
+
+        risk_score, risk_label = calculate_risk_scores(revenue_uplift_pct, churn_prob)
+
+        # CLTV Approximation (Monthly Revenue / Churn Rate)
+        cltv = (new_prices * (1 - new_discounts)) / np.maximum(0.01, churn_prob)
+
+        return pd.DataFrame({
+            "price_change_pct": price_changes,
+            "discount_change_pct": discount_changes,
+            "segment": segment,
+            "old_price": current_price,
+            "new_price": new_prices,
+            "new_discount": new_discounts,
+            "revenue_uplift_pct": revenue_uplift_pct,
+            "churn_probability": churn_prob,
+            "churn_increase": churn_prob - base_churn,
+            "risk_score": risk_score,
+            "risk_label": risk_label,
+            "predicted_units": pred_units,
+            "cltv": cltv
+        })
+
+    def simulate_uncertainty(self, current_data_summary, price_changes, discount_changes=0.0, interval=0.9):
+        """
+        Prediction intervals for a grid of scenarios, built from the individual trees
+        of the demand forest. Each tree's demand is propagated through the churn
+        model, so the churn and CLTV bands carry the demand uncertainty too.
+        Returns a DataFrame with *_low / *_high columns per scenario.
+        """
+        segment = current_data_summary['segment']
+        current_price = current_data_summary['avg_price']
+        current_discount = current_data_summary['avg_discount']
+
+        price_changes, discount_changes = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(price_changes, dtype=float)),
+            np.asarray(discount_changes, dtype=float)
+        )
+        price_changes = price_changes.ravel()
+        discount_changes = discount_changes.ravel()
+
+        new_prices = current_price * (1 + price_changes / 100.0)
+        new_discounts = np.clip(current_discount + (discount_changes / 100.0), 0, 1)
+        prices = np.append(new_prices, current_price)
+        discounts = np.append(new_discounts, current_discount)
+
+        # (n_trees, n_scenarios + 1) draws; last column is the per-tree baseline
+        with time_inference("revenue", "trees", len(prices)):
+            units, revenue = self.revenue_model.predict_demand_trees(segment, prices, discounts)
+        with time_inference("churn", "trees", units.size):
+            churn = self.churn_model.predict_churn_prob_batch(segment, prices, discounts, units)
+
+        base_revenue = revenue[:, -1:]
+        # A tree with no baseline revenue reports 0% uplift, like simulate_scenario; NaN would
+        # turn the whole band into NaN, which is not valid JSON
+        with np.errstate(divide='ignore', invalid='ignore'):
+            uplift = np.where(base_revenue > 0, (revenue[:, :-1] - base_revenue) / base_revenue * 100, 0.0)
+        cltv = (new_prices * (1 - new_discounts)) / np.maximum(0.01, churn[:, :-1])
+
+        quantiles = [(1 - interval) / 2, 1 - (1 - interval) / 2]
+        bands = {
+            "price_change_pct": price_changes,
+            "discount_change_pct": discount_changes,
+            "interval": interval
+        }
+        for name, draws in [("predicted_units", units[:, :-1]),
+                            ("revenue_uplift_pct", uplift),
+                            ("churn_probability", churn[:, :-1]),
+                            ("cltv", cltv)]:
+            low, high = np.quantile(draws, quantiles, axis=0)
+            bands[f"{name}_low"] = low
+            bands[f"{name}_high"] = high
+
+        return pd.DataFrame(bands)
+
+    def simulate_surface(self, current_data_summary, price_changes, discount_changes):
+        """
+        Evaluates the full price x discount grid (both in %) for one segment summary.
+        Returns matrices of shape (len(price_changes), len(discount_changes)).
+        """
+        price_changes = np.asarray(price_changes, dtype=float)
+        discount_changes = np.asarray(discount_changes, dtype=float)
+        price_grid, discount_grid = np.meshgrid(price_changes, discount_changes, indexing='ij')
+
+        scenarios = self.simulate_scenarios(current_data_summary, price_grid.ravel(), discount_grid.ravel())
+        shape = price_grid.shape
+
+        return {
+            "segment": current_data_summary['segment'],
+            "price_changes": price_changes,
+            "discount_changes": discount_changes,
+            "revenue_uplift_pct": scenarios['revenue_uplift_pct'].to_numpy().reshape(shape),
+            "churn_probability": scenarios['churn_probability'].to_numpy().reshape(shape),
+            "risk_score": scenarios['risk_score'].to_numpy().reshape(shape)
+        }
+
+    @staticmethod
+    def scenario_record(scenarios, index):
+        """Converts one row of a simulate_scenarios frame into a simulate_scenario style dict."""
+        row = scenarios.iloc[index]
+        return {
+            "segment": row['segment'],
+            "old_price": float(row['old_price']),
+            "new_price": float(row['new_price']),
+            "revenue_uplift_pct": float(row['revenue_uplift_pct']),
+            "churn_probability": float(row['churn_probability']),
+            "churn_increase": float(row['churn_increase']),
+            "risk_score": float(row['risk_score']),
+            "risk_label": str(row['risk_label']),
+            "predicted_units": float(row['predicted_units']),
+            "cltv": float(row['cltv'])
+        }
+
+    def iter_simulations(self, scenarios, chunk_size=512):
+        """
+        Simulates an iterable of scenarios lazily, chunk_size at a time, yielding one result
+        dict per scenario in input order. Each scenario is a dict with the summary fields
+        ('segment', 'avg_price', 'avg_discount', 'avg_units') plus 'price_change_pct' and
+        optionally 'discount_change_pct', 'include_uncertainty' and 'interval'.
+        Within a chunk, scenarios sharing a summary go through the models as one batch.
+        """
+        scenarios = iter(scenarios)
+        index = 0
+        while chunk := list(islice(scenarios, chunk_size)):
+            groups = {}
+            for i, scenario in enumerate(chunk):
+                summary_key = (scenario['segment'], scenario['avg_price'], scenario['avg_discount'], scenario['avg_units'])
+                groups.setdefault(summary_key, []).append(i)
+
+            results = [None] * len(chunk)
+            for (segment, price, discount, units), rows in groups.items():
+                summary = {'segment': segment, 'avg_price': price, 'avg_discount': discount, 'avg_units': units}
+                price_changes = [chunk[i]['price_change_pct'] for i in rows]
+                discount_changes = [chunk[i].get('discount_change_pct', 0.0) for i in rows]
+                frame = self.simulate_scenarios(summary, price_changes, discount_changes)
+                for i, record in zip(rows, frame.drop(columns='new_discount').to_dict('records')):
+                    results[i] = {"index": index + i, **record}
+
+                # Uncertainty bands, batched per requested interval
+                by_interval = {}
+                for j, i in enumerate(rows):
+                    if chunk[i].get('include_uncertainty'):
+                        by_interval.setdefault(chunk[i].get('interval', 0.9), []).append(j)
+                for interval, positions in by_interval.items():
+                    bands = self.simulate_uncertainty(summary, np.take(price_changes, positions),
+                                                      np.take(discount_changes, positions), interval=interval)
+                    band_columns = [c for c in bands.columns if c.endswith(('_low', '_high'))] + ['interval']
+                    for j, band in zip(positions, bands[band_columns].to_dict('records')):
+                        results[rows[j]].update(band)
+
+            yield from results
+            index += len(chunk)
+
+    @staticmethod
+    def _feasible(scenarios, max_churn=None, max_risk_score=None):
+        """Boolean mask of scenarios that satisfy the churn / risk constraints."""
+        mask = np.ones(len(scenarios), dtype=bool)
+        if max_churn is not None:
+            mask &= scenarios['churn_probability'].to_numpy() <= max_churn
+        if max_risk_score is not None:
+            mask &= scenarios['risk_score'].to_numpy() <= max_risk_score
+        return mask
+
+    def find_optimal_price(self, current_data_summary, max_increase=50, max_decrease=50,
+                           method="grid", max_churn=None, max_risk_score=None,
+                           max_evaluations=60, tolerance=0.1, coarse_points=21, refine_points=9):
+        """
+        Searches price changes for the one with the best revenue uplift.
+        method="grid" checks every 5% increment (the original behaviour).
+        method="refine" does a coarse-to-fine bracketing search over the continuous
+        range, spending at most max_evaluations scenarios and stopping once the
+        step is below tolerance (in % points).
+        max_churn / max_risk_score restrict the search to acceptable scenarios.
+        The result also reports the scenarios evaluated and model calls spent.
+        """
+        if method not in ("grid", "refine"):
+            raise ValueError(f"Unknown optimisation method: {method}")
+        if method == "refine" and (coarse_points < 2 or refine_points < 2 or max_evaluations < coarse_points):
+            # The first round must bracket the range, so it needs both endpoints
+            raise ValueError("method='refine' needs coarse_points >= 2, refine_points >= 2 "
+                             "and max_evaluations >= coarse_points")
+
+        lower, upper = -max_decrease, max_increase
+        lo, hi = lower, upper
+        evaluated = []
+        evaluations = 0
+        best = None  # (uplift, change, scenarios, index)
+
+        while True:
+            if method == "grid":
+                changes = np.arange(lower, upper + 5, 5)
+            else:
+                n_points = coarse_points if not evaluated else refine_points
+                n_points = min(n_points, max_evaluations - evaluations)
+                if n_points < 2:
+                    break
+                changes = np.linspace(lo, hi, n_points)
+
+            scenarios = self.simulate_scenarios(current_data_summary, changes)
+            evaluated.append(scenarios)
+            evaluations += len(changes)
+
+            # We want max revenue, but only among scenarios we are allowed to recommend
+            uplift = np.where(self._feasible(scenarios, max_churn, max_risk_score),
+                              scenarios['revenue_uplift_pct'].to_numpy(), -np.inf)
+            idx = int(np.argmax(uplift))
+            if np.isfinite(uplift[idx]) and (best is None or uplift[idx] > best[0]):
+                best = (uplift[idx], changes[idx], scenarios, idx)
+
+            # Narrow the bracket around the best point so far
+            step = (hi - lo) / (len(changes) - 1)
+            if method == "grid" or best is None or step <= tolerance:
+                break
+            lo, hi = max(lower, best[1] - step), min(upper, best[1] + step)
+
+        if best is not None:
+            _, change, scenarios, idx = best
+            best_scenario = self.scenario_record(scenarios, idx)
+            best_scenario['constraints_met'] = True
+        else:
+            # No scenario met the constraints: fall back to the least risky one seen
+            scenarios = pd.concat(evaluated, ignore_index=True)
+            idx = int(np.argmin(scenarios['risk_score'].to_numpy()))
+            change = scenarios['price_change_pct'].iloc[idx]
+            best_scenario = self.scenario_record(scenarios, idx)
+            best_scenario['constraints_met'] = False
+
+        best_scenario['optimal_price_change'] = int(change) if method == "grid" else float(change)
+        best_scenario['evaluations'] = evaluations
+        best_scenario['model_calls'] = 2 * len(evaluated)  # one batched call per model per round
         return best_scenario
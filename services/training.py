@@ -0,0 +1,43 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from models.revenue_model import RevenueModel
+from models.churn_model import ChurnModel
+from services.metrics import TRAINING_SECONDS
+
+def default_core_budget():
+    """All cores but one, so a training run leaves room for serving."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+def train_models(df, n_jobs=None, revenue_model=None, churn_model=None):
+    """
+    Trains the revenue and churn models concurrently.
+    n_jobs is the core budget for the whole run (default: default_core_budget()).
+    The churn model's LogisticRegression takes one core and the forest gets the rest.
+    Pass existing model instances to retrain them in place, otherwise fresh ones are created.
+    Returns (revenue_model, churn_model, timings) with wall-clock seconds per stage.
+    """
+    n_jobs = n_jobs or default_core_budget()
+    revenue_model = revenue_model or RevenueModel()
+    churn_model = churn_model or ChurnModel()
+    forest_jobs = max(1, n_jobs - 1)
+
+    def timed(fn, *args, **kwargs):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="train") as pool:
+        revenue_future = pool.submit(timed, revenue_model.train, df, n_jobs=forest_jobs)
+        churn_future = pool.submit(timed, churn_model.train, df)
+        timings = {
+            "revenue_model": revenue_future.result(),
+            "churn_model": churn_future.result()
+        }
+    timings["total"] = time.perf_counter() - start
+    timings["cores"] = n_jobs
+    TRAINING_SECONDS.observe(timings["revenue_model"], model="revenue")
+    TRAINING_SECONDS.observe(timings["churn_model"], model="churn")
+
+    return revenue_model, churn_model, timings
@@ -0,0 +1,322 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from models.revenue_model import RevenueModel
+from models.churn_model import ChurnModel
+from models.registry import ModelRegistry, dataset_hash
+from models.sharding import ShardedModels
+from services.simulator import PricingSimulator
+from services.analytics import AnalyticsAggregates
+
+WORKSPACE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def model_memory_bytes(model):
+    """Approximate in-memory size of a trained model (measured when it was trained or loaded); 0 if untrained."""
+    if getattr(model, "shards", None) is not None:
+        # Sharded facade: only shards loaded so far occupy memory
+        return sum(model_memory_bytes(m) for pair in list(model.shards._loaded.values()) for m in pair)
+    return getattr(model, "memory_bytes", 0)
+
+class ServingSnapshot:
+    """
+    Immutable bundle of everything a request reads: dataset (with its version key and
+    analytics), models and the simulator built on them. Publishing replaces the whole
+    snapshot with one reference swap, so readers never see a half-updated state.
+    """
+
+    __slots__ = ("dataset_key", "df", "analytics", "revenue_model", "churn_model", "simulator", "created_at")
+
+    def __init__(self, dataset_key=None, df=None, analytics=None, revenue_model=None, churn_model=None, simulator=None):
+        revenue_model = revenue_model or RevenueModel()
+        churn_model = churn_model or ChurnModel()
+        fields = {
+            "dataset_key": dataset_key,
+            "df": df,
+            "analytics": analytics,
+            "revenue_model": revenue_model,
+            "churn_model": churn_model,
+            "simulator": simulator or PricingSimulator(revenue_model, churn_model),
+            "created_at": time.time()
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ServingSnapshot is immutable; use replace()")
+
+    @property
+    def dataset_version(self):
+        return self.dataset_key
+
+    @property
+    def model_version(self):
+        return self.revenue_model.version
+
+    def replace(self, **changes):
+        """A new snapshot with some fields changed. The simulator (and its cache) is kept unless the models change."""
+        fields = {name: getattr(self, name) for name in self.__slots__ if name != "created_at"}
+        fields.update(changes)
+        if ("revenue_model" in changes or "churn_model" in changes) and "simulator" not in changes:
+            fields["simulator"] = None
+        return ServingSnapshot(**fields)
+
+class Workspace:
+    """
+    One client's dataset, segmentation and models, served through a ServingSnapshot.
+    Readers take workspace.current() without locking; writers build a new snapshot and
+    swap it in under publish_lock. Everything needed to serve is persisted on publish
+    (dataset in the DatasetCache, models in the workspace registry or shard store,
+    pointers in state.json), so a workspace can be unloaded at any time and rehydrated
+    from disk on next use.
+    """
+
+    STATE_FILE = "state.json"
+
+    def __init__(self, name, root, dataset_cache, registry_dir=None, shards_dir=None, segmenter_path=None):
+        self.name = name
+        self.root = root
+        self.dataset_cache = dataset_cache
+        os.makedirs(self.root, exist_ok=True)
+        self.registry = ModelRegistry(registry_dir or os.path.join(root, "models"))
+        self.shards_dir = shards_dir or os.path.join(root, "shards")
+        self.segmenter_path = segmenter_path or os.path.join(root, "segmenter.joblib")
+        self.publish_lock = threading.Lock()
+        self.training_lock = threading.Lock() # Single-flight for training outside publish_lock
+        self.last_used = time.time()
+        self.memory_bytes = 0
+        self.dataset_bytes = 0
+        self.rehydrations = 0
+        self.evictions = 0
+        self.snapshot = None # None while unloaded
+        self._shard_store = None
+
+    @property
+    def loaded(self):
+        return self.snapshot is not None
+
+    @property
+    def shard_store(self):
+        if self._shard_store is None:
+            self._shard_store = ShardedModels(self.shards_dir)
+        return self._shard_store
+
+    def _read_state(self):
+        path = os.path.join(self.root, self.STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_state(self, state):
+        path = os.path.join(self.root, self.STATE_FILE)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def current(self):
+        """The serving snapshot, rehydrating it from disk if the workspace was unloaded."""
+        snapshot = self.snapshot
+        return snapshot if snapshot is not None else self.load()
+
+    def load(self):
+        """Rehydrates dataset and models from disk (no-op if already loaded). Returns the snapshot."""
+        with self.publish_lock:
+            if self.snapshot is not None:
+                return self.snapshot
+            state = self._read_state()
+            if state.get("sharded"):
+                view = self.shard_store.view()
+                revenue_model, churn_model = view.revenue_model, view.churn_model
+            else:
+                revenue_model, churn_model = RevenueModel(), ChurnModel()
+                self.registry.load(revenue_model, churn_model)
+
+            dataset_key = state.get("dataset_key")
+            df = self.dataset_cache.get(dataset_key) if dataset_key else None
+            snapshot = ServingSnapshot(
+                dataset_key=dataset_key if df is not None else None,
+                df=df,
+                analytics=AnalyticsAggregates.from_frame(df) if df is not None else None,
+                revenue_model=revenue_model,
+                churn_model=churn_model
+            )
+            if df is not None or revenue_model.version is not None:
+                self.rehydrations += 1
+            self._swap(snapshot)
+            return snapshot
+
+    def publish(self, df, revenue_model, churn_model, analytics=None, sharded=False, dataset_key=None):
+        """
+        Persists the dataset pointer and atomically swaps in a snapshot with freshly trained
+        models (and their dataset). df=None keeps the current dataset. Models must already be
+        persisted (registered or sharded). Everything expensive happens before the swap.
+        """
+        current = self.current()
+        state = self._read_state()
+        if df is not None:
+            dataset_key = dataset_key or dataset_hash(df)
+            self.dataset_cache.put(dataset_key, df)
+            state["dataset_key"] = dataset_key
+            if analytics is None:
+                analytics = AnalyticsAggregates.from_frame(df)
+        state["sharded"] = sharded
+
+        with self.publish_lock:
+            self._write_state(state)
+            changes = {"revenue_model": revenue_model, "churn_model": churn_model}
+            if df is not None:
+                changes.update(dataset_key=dataset_key, df=df, analytics=analytics)
+            snapshot = (self.snapshot or current).replace(**changes)
+            self._swap(snapshot)
+            return snapshot
+
+    def publish_snapshot(self, build):
+        """
+        Swaps in build(current_snapshot) for changes that aren't persisted (e.g. fallback data).
+        build may return the snapshot unchanged to skip the swap. It runs under publish_lock,
+        so it must be cheap: do any training beforehand.
+        """
+        with self.publish_lock:
+            snapshot = build(self.snapshot or ServingSnapshot())
+            if snapshot is not self.snapshot:
+                self._swap(snapshot)
+            return snapshot
+
+    def unload(self):
+        """Drops the in-memory snapshot; it is rehydrated from disk on next use."""
+        with self.publish_lock:
+            self.snapshot = None
+            self.memory_bytes = 0
+            self.dataset_bytes = 0
+            # The store keeps every shard it trained or loaded; rehydration reopens it from disk
+            self._shard_store = None
+
+    def _swap(self, snapshot):
+        # Callers hold publish_lock; the assignment itself is what readers observe
+        self.snapshot = snapshot
+        self.dataset_bytes = int(snapshot.df.memory_usage(deep=True).sum()) if snapshot.df is not None else 0
+        self.memory_bytes = self.dataset_bytes + model_memory_bytes(snapshot.revenue_model) + model_memory_bytes(snapshot.churn_model)
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "name": self.name,
+            "loaded": snapshot is not None,
+            "memory_bytes": self.memory_bytes,
+            "dataset_bytes": self.dataset_bytes,
+            "rows": len(snapshot.df) if snapshot is not None and snapshot.df is not None else 0,
+            "dataset_version": snapshot.dataset_version if snapshot is not None else None,
+            "model_version": snapshot.model_version if snapshot is not None else None,
+            "rehydrations": self.rehydrations,
+            "evictions": self.evictions,
+            "last_used": self.last_used
+        }
+
+class WorkspaceManager:
+    """
+    Per-client workspaces with an LRU memory budget.
+    When the resident workspaces exceed memory_budget_bytes, the least recently used
+    ones (other than the one just used) are unloaded; they rehydrate from disk on demand.
+    The "default" workspace uses the legacy top-level data paths.
+    """
+
+    DEFAULT = "default"
+
+    def __init__(self, root, dataset_cache, memory_budget_bytes, default_paths=None):
+        self.root = root
+        self.dataset_cache = dataset_cache
+        self.memory_budget_bytes = memory_budget_bytes
+        self.default_paths = default_paths or {}
+        self.evictions = 0
+        self._workspaces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name=DEFAULT):
+        """The named workspace, loaded and marked most recently used."""
+        if not WORKSPACE_NAME.match(name):
+            raise ValueError(f"Invalid workspace name: {name}")
+        with self._lock:
+            workspace = self._workspaces.get(name)
+            if workspace is None:
+                paths = self.default_paths if name == self.DEFAULT else {}
+                workspace = Workspace(name, paths.get("root", os.path.join(self.root, name)),
+                                      self.dataset_cache,
+                                      registry_dir=paths.get("registry_dir"),
+                                      shards_dir=paths.get("shards_dir"),
+                                      segmenter_path=paths.get("segmenter_path"))
+                self._workspaces[name] = workspace
+            self._workspaces.move_to_end(name)
+            workspace.last_used = time.time()
+
+        workspace.current()
+        self.enforce_budget(keep=name)
+        return workspace
+
+    def enforce_budget(self, keep=None):
+        """Unloads least recently used workspaces until resident memory fits the budget."""
+        victims = []
+        with self._lock:
+            resident = [w for w in self._workspaces.values() if w.loaded]
+            total = sum(w.memory_bytes for w in resident)
+            for workspace in resident:
+                if total <= self.memory_budget_bytes:
+                    break
+                if workspace.name == keep:
+                    continue
+                total -= workspace.memory_bytes
+                victims.append(workspace)
+                workspace.evictions += 1
+                self.evictions += 1
+        # unload() waits for the workspace's publish_lock; don't hold up get() meanwhile
+        for workspace in victims:
+            workspace.unload()
+
+    def prune_dataset_cache(self, grace_seconds=3600):
+        """
+        Removes cached datasets that no workspace's state.json points at, including workspaces
+        not loaded in this process. Entries stored or read within grace_seconds are kept, so
+        uploads still being processed (and other cache users) don't lose their frames.
+        Returns the removed keys.
+        """
+        roots = [os.path.join(self.root, name) for name in os.listdir(self.root)]
+        roots.append(self.default_paths.get("root", os.path.join(self.root, self.DEFAULT)))
+        referenced = set()
+        for root in roots:
+            path = os.path.join(root, Workspace.STATE_FILE)
+            if os.path.exists(path):
+                with open(path) as f:
+                    referenced.add(json.load(f).get("dataset_key"))
+
+        cutoff = time.time() - grace_seconds
+        removed = []
+        for key in self.dataset_cache.keys():
+            try:
+                if key in referenced or self.dataset_cache.last_used(key) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.dataset_cache.remove(key)
+            removed.append(key)
+        return removed
+
+    def resident(self):
+        """Workspaces currently loaded in memory, least recently used first."""
+        with self._lock:
+            return [w for w in self._workspaces.values() if w.loaded]
+
+    def stats(self):
+        with self._lock:
+            workspaces = [w.stats() for w in self._workspaces.values()]
+            evictions = self.evictions
+        return {
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "resident_bytes": sum(w["memory_bytes"] for w in workspaces if w["loaded"]),
+            "evictions": evictions,
+            "rehydrations": sum(w["rehydrations"] for w in workspaces),
+            "workspaces": workspaces
+        }
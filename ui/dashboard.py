@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import os
@@ -9,15 +10,21 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from services.data_generator import generate_synthetic_data
-from services.preprocessing import preprocess_pipeline
-from services.segmentation import perform_segmentation
+from services.preprocessing import preprocess_pipeline, clean_data, feature_engineering
+from services.dataset_cache import DatasetCache, hash_bytes
+from services.segmentation import perform_segmentation, SegmentationModel
 from models.revenue_model import RevenueModel
 from models.churn_model import ChurnModel
 from services.simulator import PricingSimulator
+from services.training import train_models, default_core_budget
 from reports.report_generator import generate_pdf_report
 
 st.set_page_config(page_title="AI Pricing Strategy Advisor", layout="wide", page_icon="💰")
 
+@st.cache_resource
+def get_dataset_cache():
+    return DatasetCache("data/cache")
+
 # --- PREMIUM MODERN CSS ---
 st.markdown("""
 <style>
@@ -138,6 +145,7 @@ if 'revenue_model' not in st.session_state:
     # Train immediately
     if st.session_state.df is not None:
          st.session_state.revenue_model.train(st.session_state.df)
+         st.session_state.revenue_model.fit_surrogate(st.session_state.df)
 
 if 'churn_model' not in st.session_state:
     st.session_state.churn_model = ChurnModel()
@@ -145,6 +153,10 @@ if 'churn_model' not in st.session_state:
     if st.session_state.df is not None:
         st.session_state.churn_model.train(st.session_state.df)
 
+if 'simulator' not in st.session_state:
+    # Kept across reruns so repeated slider positions hit the simulator cache
+    st.session_state.simulator = PricingSimulator(st.session_state.revenue_model, st.session_state.churn_model)
+
 if 'models_trained' not in st.session_state:
     st.session_state.models_trained = True
 
@@ -187,31 +199,41 @@ if page == "Data Studio":
             with open(path, "wb") as f:
                 f.write(uploaded_file.getbuffer())
             st.success("✅ Uploaded")
+            auto_segments = st.checkbox("Auto-detect number of segments", value=False)
             
             if st.button("🚀 Process & Train AI"):
                 with st.spinner("🧠 Analyzing psychology of pricing..."):
-                    df = preprocess_pipeline(path)
-                    df, _, _ = perform_segmentation(df)
+                    # A file seen before is memory-mapped from the cache instead of re-parsed
+                    dataset_cache = get_dataset_cache()
+                    cache_key = hash_bytes(uploaded_file.getbuffer()) + ("-auto" if auto_segments else "")
+                    df = dataset_cache.get(cache_key)
+                    if df is None:
+                        df = preprocess_pipeline(path)
+                        segmenter = SegmentationModel(n_clusters="auto" if auto_segments else 3, algorithm="minibatch",
+                                                      n_jobs=default_core_budget())
+                        df = segmenter.fit(df).assign(df)
+                        if segmenter.selection:
+                            selection = segmenter.selection
+                            st.info(f"Found {selection['k']} segments (scored k={min(selection['scores'])}-{max(selection['scores'])} in {selection['seconds']:.1f}s)")
+                        dataset_cache.put(cache_key, df)
                     st.session_state.df = df
-                    st.session_state.revenue_model.train(df)
-                    st.session_state.churn_model.train(df)
+                    _, _, timings = train_models(df, revenue_model=st.session_state.revenue_model, churn_model=st.session_state.churn_model)
+                    st.session_state.revenue_model.fit_surrogate(df)
                     st.session_state.models_trained = True
                 st.balloons()
-                st.success("AI Models Ready!")
+                st.success(f"AI Models Ready! Trained in {timings['total']:.1f}s on {timings['cores']} cores.")
 
     with c2:
         st.markdown("### 🧪 Demo Mode")
         st.info("Don't have data? Generate a synthetic SaaS dataset.")
         if st.button("🎲 Generate & Load Dummy Data"):
             with st.spinner("Creating virtual customers..."):
-                df = generate_synthetic_data(2000)
-                path = "data/raw/synthetic_demo.csv"
-                df.to_csv(path, index=False)
-                df = preprocess_pipeline(path)
+                # Already in memory, so skip the CSV round trip
+                df = feature_engineering(clean_data(generate_synthetic_data(2000)))
                 df, _, _ = perform_segmentation(df)
                 st.session_state.df = df
-                st.session_state.revenue_model.train(df)
-                st.session_state.churn_model.train(df)
+                train_models(df, revenue_model=st.session_state.revenue_model, churn_model=st.session_state.churn_model)
+                st.session_state.revenue_model.fit_surrogate(df)
                 st.session_state.models_trained = True
             st.success("Demo Data Active!")
 
@@ -243,7 +265,7 @@ elif page == "Simulation Lab":
         st.error("⚠️ Please train the AI models in 'Data Studio' first.")
     else:
         df = st.session_state.df
-        simulator = PricingSimulator(st.session_state.revenue_model, st.session_state.churn_model)
+        simulator = st.session_state.simulator
         
         # Top Controls
         col_ctrl, col_vis = st.columns([1, 2])
@@ -266,12 +288,18 @@ elif page == "Simulation Lab":
             """, unsafe_allow_html=True)
             
             price_change = st.slider("Price Adjustment (%)", -50, 100, 0, help="Slide to change price")
+            fast_mode = st.toggle("⚡ Fast Mode", help="Answer from the distilled demand curves instead of the full forest")
+            simulator.mode = "fast" if fast_mode else "exact"
+            surrogate = st.session_state.revenue_model.surrogate
+            if fast_mode and surrogate is not None and selected_segment in surrogate.fidelity:
+                st.caption(f"Surrogate error vs forest: {surrogate.fidelity[selected_segment]['relative_mae']:.1%} of avg units")
             
             st.markdown("---")
             st.markdown("### ✨ AI Auto-Pilot")
+            max_churn = st.slider("Max Acceptable Churn (%)", 0, 100, 100, help="Auto-Pilot only recommends prices below this churn risk")
             if st.button("⚡ Find Optimal Price"):
                 summary_data = {'segment': selected_segment, 'avg_price': curr_price, 'avg_units': curr_units, 'avg_discount': curr_disc}
-                best_scenario = simulator.find_optimal_price(summary_data)
+                best_scenario = simulator.find_optimal_price(summary_data, method="refine", max_churn=max_churn / 100.0)
                 
                 st.session_state.last_simulation = best_scenario
                 st.session_state.auto_optimized = True # Flag to show specific text
@@ -286,9 +314,12 @@ elif page == "Simulation Lab":
             # Check if optimized just ran
             if 'auto_optimized' in st.session_state and st.session_state.auto_optimized:
                 result = st.session_state.last_simulation
-                price_change = result.get('optimal_price_change', 0)
+                price_change = round(result.get('optimal_price_change', 0), 1)
                 st.session_state.auto_optimized = False # Reset
-                st.info(f"✨ AI Found the Sweet Spot: {price_change}% Increase!")
+                if result.get('constraints_met', True):
+                    st.info(f"✨ AI Found the Sweet Spot: {price_change}% Increase!")
+                else:
+                    st.warning(f"⚠️ No price met the churn limit. Least risky option: {price_change}% change.")
             else:
                 result = simulator.simulate_scenario(summary_data, price_change)
                 st.session_state.last_simulation = result
@@ -329,18 +360,17 @@ elif page == "Simulation Lab":
         st.markdown("### 📈 Sensitivity Analysis")
         st.caption("How does Revenue and Churn react to different price points?")
         
-        # Calculate curve
-        x_vals = []
-        y_rev = []
-        y_churn = []
-        
-        for p in range(-50, 101, 5):
-            sim = simulator.simulate_scenario(summary_data, p)
-            x_vals.append(p)
-            y_rev.append(sim['revenue_uplift_pct'])
-            y_churn.append(sim['churn_probability'] * 100)
+        # Calculate curve (one batched pass per model)
+        curve = simulator.simulate_scenarios(summary_data, list(range(-50, 101, 5)))
+        bands = simulator.simulate_uncertainty(summary_data, list(range(-50, 101, 5)))
+        x_vals = curve['price_change_pct']
+        y_rev = curve['revenue_uplift_pct']
+        y_churn = curve['churn_probability'] * 100
             
         fig_sens = go.Figure()
+        # 90% band across the forest's trees
+        fig_sens.add_trace(go.Scatter(x=x_vals, y=bands['revenue_uplift_pct_high'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+        fig_sens.add_trace(go.Scatter(x=x_vals, y=bands['revenue_uplift_pct_low'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(52, 211, 153, 0.15)', name='Revenue 90% Band', hoverinfo='skip'))
         fig_sens.add_trace(go.Scatter(x=x_vals, y=y_rev, mode='lines+markers', name='Revenue Uplift %', line=dict(color='#34d399', width=3)))
         fig_sens.add_trace(go.Scatter(x=x_vals, y=y_churn, mode='lines+markers', name='Churn Risk %', line=dict(color='#f87171', width=3, dash='dot')))
         
@@ -357,6 +387,37 @@ elif page == "Simulation Lab":
         )
         st.plotly_chart(fig_sens, use_container_width=True)
 
+        # --- PRICE x DISCOUNT SURFACE ---
+        st.markdown("---")
+        st.markdown("### 🗺️ Price × Discount Surface")
+        st.caption("Revenue uplift for every combination of price and discount change.")
+
+        resolution = st.slider("Grid Resolution", 5, 100, 25, help="Points per axis")
+        surface = simulator.simulate_surface(
+            summary_data,
+            np.linspace(-50, 100, resolution),
+            np.linspace(-20, 20, resolution)
+        )
+
+        fig_surface = go.Figure(data=go.Heatmap(
+            z=surface['revenue_uplift_pct'].T,
+            x=surface['price_changes'],
+            y=surface['discount_changes'],
+            colorscale='RdYlGn',
+            zmid=0,
+            colorbar=dict(title="Rev Uplift %"),
+            customdata=(surface['churn_probability'].T * 100),
+            hovertemplate="Price %{x:.1f}%<br>Discount %{y:+.1f} pts<br>Rev Uplift %{z:.1f}%<br>Churn %{customdata:.1f}%<extra></extra>"
+        ))
+        fig_surface.update_layout(
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            font={'color': "white"},
+            xaxis_title="Price Change (%)",
+            yaxis_title="Discount Change (pts)"
+        )
+        st.plotly_chart(fig_surface, use_container_width=True)
+
 
 # --- PAGE 3: STRATEGY REPORT ---
 elif page == "Strategy Export":